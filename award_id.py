@@ -12,45 +12,110 @@ Date: 2020-11-17
 
 """
 
+import datetime
+import hashlib
+import os
+import re
+import string
+import time
+from collections import namedtuple
+
+try:
+    from .lazy_import import LazyModule
+except ImportError:
+    from lazy_import import LazyModule
+
+# These are imported only the first time they are used
+mp = LazyModule('multiprocessing')
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
 # TODO Find a better solution to generalize this line
 folder = 'data/interim'
 
+# The translation tables of removePunctuation(), by 'preserve'
+_punctuation_tables = {}
+
 def removePunctuation(word, preserve=None):
-    import string
-    punctuation = string.punctuation
-    if preserve is not None:
-        for c in preserve:
-            punctuation = punctuation.replace(c,'')
-    word = word.translate(str.maketrans('','',punctuation))
+    table = _punctuation_tables.get(preserve)
+    if table is None:
+        punctuation = string.punctuation
+        if preserve is not None:
+            for c in preserve:
+                punctuation = punctuation.replace(c,'')
+        table = str.maketrans('','',punctuation)
+        _punctuation_tables[preserve] = table
+    word = word.translate(table)
     return word
 
+class EnglishDictionary:
+    """The English dictionary (i.e., the nltk words corpus) 
+     and the basic form of the words
+    
+    The words are loaded once in a frozenset, so that looking for a word 
+     doesn't require to scan the whole list. The basic forms are memoized 
+     in a LRU cache with at most 'maxsize' words (see cache_info() for 
+     the number of hits and misses)
+    """
+    
+    def __init__(self, maxsize=100000):
+        from functools import lru_cache
+        from nltk.corpus import words
+        from nltk.stem.wordnet import WordNetLemmatizer
+        
+        self.words = frozenset(words.words())
+        self._lemmatizer = WordNetLemmatizer()
+        self.basicForm = lru_cache(maxsize)(self._basicForm)
+    
+    def _basicForm(self, word):
+        lemmatizer = self._lemmatizer
+        # Remove punctuation
+        word = removePunctuation(word)
+        # Take the lower case for each letter in the string
+        word = word.lower()
+        # Take the singular form of the word
+        word = lemmatizer.lemmatize(word)
+        # Take the present tense of the word
+        word = lemmatizer.lemmatize(word,'v')
+        return word
+    
+    def __contains__(self, word):
+        return word in self.words
+    
+    def cache_info(self):
+        return self.basicForm.cache_info()
+    
+    def cache_clear(self):
+        self.basicForm.cache_clear()
+
+_english_dictionary = None
+
+def getEnglishDictionary():
+    # The dictionary is loaded only once and then shared
+    global _english_dictionary
+    if _english_dictionary is None:
+        _english_dictionary = EnglishDictionary()
+    return _english_dictionary
+
 def getBasicForm(word):
-    from nltk.stem.wordnet import WordNetLemmatizer
-    lemmatizer = WordNetLemmatizer()
-    # Remove punctuation
-    word = removePunctuation(word)
-    # Take the lower case for each letter in the string
-    word = word.lower()
-    # Take the singular form of the word
-    word = lemmatizer.lemmatize(word)
-    # Take the present tense of the word
-    word = lemmatizer.lemmatize(word,'v')
-    return word
+    return getEnglishDictionary().basicForm(word)
 
-def includeWord(word):
-    from nltk.corpus import words
+def includeWord(word, dictionary=None):
+    if dictionary is None:
+        dictionary = getEnglishDictionary()
     
     word = removePunctuation(word)
     if len(word)<3 and word.isupper() and word.isalpha():
         return True
     if any(c.isdigit() for c in word):# and sum(c.islower() for c in word)<3: # TO HAVE EXCLUDED THE WORDS WITH LOWER CHARS. IS POTENTIALLY DANGEROUS -> NOW IT RETAINS WORDS WITH ONE OR TWO LOWER CHARS. (THIS ACCOUNTS FOR OCR MISTAKES AND SIMILAR)
         return True
-    if getBasicForm(word) not in words.words():# and (not any(c.isdigit() for c in word)):
+    if dictionary.basicForm(word) not in dictionary:# and (not any(c.isdigit() for c in word)):
         return True
 
+_year = re.compile(r'(^(19|20)[0-9]{2}$)')
+
 def isYear(word, current_year):
-    import re
-    match = re.match(r'(^(19|20)[0-9]{2}$)', word)
+    match = _year.match(word)
     if match is None:
         return False
     else:
@@ -60,197 +125,381 @@ def isYear(word, current_year):
         else:
             return False
 
+_acronym_separators = re.compile('-|/')
+
 def isAcronym(word, excludedAcronyms):
-    import re
-    
     word = removePunctuation(word, '-/')
     word_ = removePunctuation(word)
     if (word_.isupper() and 
         word_.isalpha() and 
-        any([w in excludedAcronyms for w in re.split('-|/',word)])):
+        any([w in excludedAcronyms 
+             for w in _acronym_separators.split(word)])):
         return True
     return False
 
 def addIsolated(all_strings, identified_string_idx,
                 other_identified_strings,
                 excludedAcronyms, stops,
-                forward=False):
-    # TODO
-    # Maybe the forward search can be implemented
-    #  by reverting the all_strings list, i.e. all_strings[::-1]
-    from nltk.corpus import words
-    import re
-    
-    #i = all_strings.index(identified_string)
-    identified_string = all_strings[identified_string_idx]
-    i = identified_string_idx
-    if ((not forward and i==0) or 
-        (forward and i==(len(all_strings)-1))):
-        return identified_string
-    if not forward:
-        candidate_piece_idx = i-1
-    else:
-        candidate_piece_idx = i+1
-    candidate_piece = all_strings[candidate_piece_idx]
-    if ((forward and 
-        (identified_string[-1:] in stops or
-         candidate_piece[:1] in stops)) or 
-        (not forward and 
-        (identified_string[:1] in stops or
-         candidate_piece[-1:] in stops))):
-        return identified_string
-    candidate_piece = candidate_piece.translate(str.maketrans('','',stops))
-    if ((candidate_piece.isupper() and 
-         #removePunctuation(candidate_piece).isalpha() and
-         not isAcronym(candidate_piece, excludedAcronyms)) or
-         (len(removePunctuation(candidate_piece))<5 and 
-          removePunctuation(candidate_piece).isnumeric())):
-        new_sg = addIsolated(all_strings, candidate_piece_idx, 
-                             other_identified_strings,
-                             excludedAcronyms, stops, forward)
-        if isinstance(new_sg, list):
-                new_sg = new_sg[0]
+                forward=False, dictionary=None):
+    # Look at the word immediately before (or after, if forward) the one 
+    #  identified as potential award id and, if it is not an acronym, 
+    #  join them with a '+' (and so on with the words before/after it). 
+    #  See IsolatedExpander, that is used to do the same for all 
+    #  the potential award ids of a statement
+    expander = IsolatedExpander(all_strings, other_identified_strings,
+                                excludedAcronyms, stops, dictionary)
+    return expander.expand(identified_string_idx, forward)
+
+class IsolatedExpander:
+    """Expand the potential award ids of a statement with their neighbours
+    
+    It is built once for each (tokenized) statement. expand() returns 
+     the same output that the recursive version of addIsolated() returned, 
+     but it walks the tokens iteratively and it remembers, for each token, 
+     whether it can be attached to its neighbours and how far the chain 
+     of attachable tokens goes in each direction. So, long statements 
+     with many numbers don't take quadratic time (nor deep recursion). 
+    positions() gives the positions of a token in the statement, 
+     from an index built the first time that it is needed
+    """
+    
+    def __init__(self, all_strings, other_identified_strings,
+                 excludedAcronyms, stops, dictionary=None):
+        self.all_strings = all_strings
+        self.other_identified_strings = set(other_identified_strings)
+        self.excludedAcronyms = excludedAcronyms
+        self.stops = stops
+        self.dictionary = dictionary
+        self._stops_table = str.maketrans('','',stops)
+        self._positions = None
+        self._attachable = {}
+        self._reach = {False:{}, True:{}}
+    
+    def positions(self, word):
+        if self._positions is None:
+            self._positions = {}
+            for idx, elm in enumerate(self.all_strings):
+                self._positions.setdefault(elm, []).append(idx)
+        return self._positions.get(word, [])
+    
+    def _isAttachable(self, idx):
+        # A token can be attached to a potential award id if, without 
+        #  the stops, it is uppercase and it is not an acronym, 
+        #  or if it is a short number
+        attachable = self._attachable.get(idx)
+        if attachable is None:
+            candidate_piece = self.all_strings[idx].translate(
+                self._stops_table)
+            candidate_piece_ = removePunctuation(candidate_piece)
+            attachable = bool(
+                (candidate_piece.isupper() and 
+                 not isAcronym(candidate_piece, self.excludedAcronyms)) or
+                (len(candidate_piece_)<5 and candidate_piece_.isnumeric()))
+            self._attachable[idx] = attachable
+        return attachable
+    
+    def _canExtend(self, idx, forward):
+        all_strings = self.all_strings
+        stops = self.stops
         if not forward:
-            if (len(all_strings)>(i+2) and 
-                all_strings[i+1]=='and' and 
-                all_strings[i+2]!=new_sg and 
-                not any(c.islower() for c in all_strings[i+2]) and
-                not isAcronym(all_strings[i+2], excludedAcronyms) and
-                all_strings[i+2] not in words.words() and 
-                abs(len(identified_string)-len(all_strings[i+2]))<2):
-                if len(all_strings)>(i+3):
-                    if all_strings[i+3] not in other_identified_strings:
-                        return [new_sg + '+' + identified_string, 
-                                new_sg + '+' + all_strings[i+2]]
-                    else:
-                        return [new_sg + '+' + identified_string]
-                else:
-                    return [new_sg + '+' + identified_string, 
-                            new_sg + '+' + all_strings[i+2]]
-            else:
-                return [new_sg + '+' + identified_string]
-        else:
-            return [identified_string + '+' + new_sg]
-#     else:
-    return identified_string
+            if idx==0:
+                return False
+            if (all_strings[idx][:1] in stops or 
+                all_strings[idx-1][-1:] in stops):
+                return False
+            return self._isAttachable(idx-1)
+        if idx==(len(all_strings)-1):
+            return False
+        if (all_strings[idx][-1:] in stops or 
+            all_strings[idx+1][:1] in stops):
+            return False
+        return self._isAttachable(idx+1)
+    
+    def _reachFrom(self, idx, forward):
+        # Position of the last token of the chain that starts from idx
+        reach = self._reach[forward]
+        step = 1 if forward else -1
+        path = []
+        while idx not in reach and self._canExtend(idx, forward):
+            path.append(idx)
+            idx += step
+        end = reach.setdefault(idx, idx)
+        for i in path:
+            reach[i] = end
+        return end
+    
+    def expand(self, identified_string_idx, forward=False):
+        all_strings = self.all_strings
+        i = identified_string_idx
+        identified_string = all_strings[i]
+        end = self._reachFrom(i, forward)
+        if end==i:
+            return identified_string
+        if forward:
+            return ['+'.join(all_strings[i:end+1])]
+        
+        new_sg = '+'.join(all_strings[end:i])
+        expanded = [new_sg + '+' + identified_string]
+        # Like "AA 1111 and 2222", where also AA+2222 is added
+        if (len(all_strings)>(i+2) and 
+            all_strings[i+1]=='and' and 
+            all_strings[i+2]!=new_sg and 
+            not any(c.islower() for c in all_strings[i+2]) and
+            not isAcronym(all_strings[i+2], self.excludedAcronyms) and
+            all_strings[i+2] not in self._getDictionary() and 
+            abs(len(identified_string)-len(all_strings[i+2]))<2 and
+            (len(all_strings)<=(i+3) or 
+             all_strings[i+3] not in self.other_identified_strings)):
+            expanded.append(new_sg + '+' + all_strings[i+2])
+        return expanded
+    
+    def _getDictionary(self):
+        if self.dictionary is None:
+            self.dictionary = getEnglishDictionary()
+        return self.dictionary
 
-def excludeLaws(gi_statement):
-    # These regexs are based on the one provided by the USPTO
-    #  You can find it here
-    #  https://github.com/CSSIP-AIR/government-interest-parsing
-    import re
+class LawRemover:
+    """Remove the references to laws and regulations from a statement
     
-    #gi_statement = gi_statement.replace('§','')
+    The patterns are compiled once. Before applying the pattern of a 
+     family of laws, a cheap check looks for a short piece of text that 
+     any of its matches necessarily contains (a literal, or a regex without 
+     optional prefixes), so that the slow patterns are applied only to 
+     the statements that can contain a reference of that family. 
+     The patterns are still applied in the same order as before, since 
+     removing a reference can join two pieces of text into another one.
+    remove() returns also the list of the families actually removed
+    """
     
-    len_check = len(gi_statement)
+    families = ['SBIR','NASA Act','Public Law','U.S.C.',
+                'C.F.R.','FAR','Statute','ASPR']
     
-    if len(re.findall('S\.?B\.?I\.?R\.?',gi_statement))>0:
+    def __init__(self):
+        # These regexs are based on the one provided by the USPTO
+        #  You can find it here
+        #  https://github.com/CSSIP-AIR/government-interest-parsing
         sbir_statement = '106-554, Small Business Reauthorization Act of 2000' # It seems that there is only one case like this. Remove or generalize...
-        gi_statement = re.sub(sbir_statement,'',gi_statement)
-    
-    #if len(re.findall('N\.?A\.?S\.?A\.?',gi_statement))>0:
-    nasa_statement = ('([Ss]ection\s)?(305|20135\(b\)) of the (National '
-                      'Aeronautic(s)? (&|and) Space|NASA) Act(ion)?'
-                      '(\s(of\s)?\(?1958)?')
-    gi_statement = re.sub(nasa_statement,'',gi_statement)
-    
-    law_statements = [
-        'P(ublic|\.) [Ll](aw|\.) \d{2,3}\s?[-–]+\s?\d{2,3}', # dovrei aver sostituito – con -, quindi qui non dovrebbe piu' servire...
-        ('([\(\s]\d{2,3}\s)?[Uu]\.?[Ss]\.?\s?[Cc]\.?([Pp]\.?)?\s?'
-         '(§|\.?sctn\.?|[Cc]hapter|[Ss]ec(tion|\.)?)?\s*(111-)?'
-         '\d{3,6}'),
-        ('[1-4][0-9]\s?C\.?F\.?R\.?\s?'
-         '([Ss]ec(tion|\.)|\.sctn\.|[Pp]art|§)?\s?[0-9\.-]+\s?'
-         '(\([A-Za-z]\))?\s?(\([0-9]\))?(\([ivx]{1,3}\))?'),
-        '[Ff][Aa][Rr]\s([Rr]egulation\s)?[0-9\.-]+',
-        '((\d{2,3}\s)?[Ss][Tt][Aa][Tt]?(ute)?\.?\s\d{3,4})\|?(?![\d-])',
-        'ASPR (Section\s)?7-\d{3}.\d{2}(\s?\([a-z]\))?'
-    ]
-    for law_statement in law_statements:
-         gi_statement = re.sub(law_statement,'',gi_statement)
-    
-#     law_statement = ('(\d{2,3}\s?[-–]+\s?\d{2,3}|(\d{2}\s)?[Uu]\.?[Ss]\.?'
-#                      '[Cc]\.?\s&?(§|\.?sctn\.?|[Cc]hapter|&?[Ss]ec(t)?'
-#                      '(ion|\.)?)?[\s;]{0,2}(111-)?\d{3,6}|(\d{2,3}\s)?'
-#                      '[Ss][Tt][Aa][Tt]?\.?\s\d{3,4})\|?(?![\d-])|'
-#                      '([Ff][Aa][Rr]\s([Rr]egulation\s)?[0-9\.-]+)|'
-#                      '(48 CFR 52\.227-11)|(402 U\.?S\.?\s?C\.?P\.? 2457)|'
-#                      '(72 Statute 435)')
-    
-    public_law = False
-    if len(gi_statement) < len_check or gi_statement.find('Public Law')!=-1:
-        public_law = True
+        nasa_statement = ('([Ss]ection\s)?(305|20135\(b\)) of the (National '
+                          'Aeronautic(s)? (&|and) Space|NASA) Act(ion)?'
+                          '(\s(of\s)?\(?1958)?')
+        law_statements = [
+            'P(ublic|\.) [Ll](aw|\.) \d{2,3}\s?[-–]+\s?\d{2,3}', # dovrei aver sostituito – con -, quindi qui non dovrebbe piu' servire...
+            ('([\(\s]\d{2,3}\s)?[Uu]\.?[Ss]\.?\s?[Cc]\.?([Pp]\.?)?\s?'
+             '(§|\.?sctn\.?|[Cc]hapter|[Ss]ec(tion|\.)?)?\s*(111-)?'
+             '\d{3,6}'),
+            ('[1-4][0-9]\s?C\.?F\.?R\.?\s?'
+             '([Ss]ec(tion|\.)|\.sctn\.|[Pp]art|§)?\s?[0-9\.-]+\s?'
+             '(\([A-Za-z]\))?\s?(\([0-9]\))?(\([ivx]{1,3}\))?'),
+            '[Ff][Aa][Rr]\s([Rr]egulation\s)?[0-9\.-]+',
+            '((\d{2,3}\s)?[Ss][Tt][Aa][Tt]?(ute)?\.?\s\d{3,4})\|?(?![\d-])',
+            'ASPR (Section\s)?7-\d{3}.\d{2}(\s?\([a-z]\))?'
+        ]
+        self._patterns = [re.compile(pattern) for pattern in 
+                          [sbir_statement, nasa_statement] + law_statements]
+        self._sbir = re.compile('S\.?B\.?I\.?R\.?')
+        
+        # Each of these is contained in any match of the respective pattern
+        self._anchors = [('106-554',),
+                         ('305 of the ','20135(b) of the '),
+                         ('Public L','Public l','P. L','P. l'),
+                         re.compile('[Uu]\.?[Ss]\.?\s?[Cc]'),
+                         re.compile('C\.?F\.?R'),
+                         re.compile('[Ff][Aa][Rr]\s'),
+                         re.compile('[Ss][Tt][Aa][Tt]?(ute)?\.?\s\d'),
+                         ('ASPR ',)]
     
+    def _isCandidate(self, i, gi_statement):
+        anchor = self._anchors[i]
+        if isinstance(anchor, tuple):
+            return any(literal in gi_statement for literal in anchor)
+        return anchor.search(gi_statement) is not None
+    
+    def remove(self, gi_statement):
+        len_check = len(gi_statement)
+        
+        laws = []
+        for i,pattern in enumerate(self._patterns):
+            if not self._isCandidate(i, gi_statement):
+                continue
+            if i==0 and self._sbir.search(gi_statement) is None:
+                continue
+            gi_statement_ = pattern.sub('',gi_statement)
+            if gi_statement_!=gi_statement:
+                gi_statement = gi_statement_
+                laws.append(self.families[i])
+        
+        public_law = False
+        if len(gi_statement) < len_check or gi_statement.find('Public Law')!=-1:
+            public_law = True
+        
+        return gi_statement, public_law, laws
+
+_law_remover = None
+
+def excludeLaws(gi_statement, return_laws=False):
+    """Remove the references to laws and regulations from the statement
+    and return it with a flag that is True if any reference was found. 
+    With return_laws=True, the families of the references removed 
+    (see LawRemover.families) are returned as well
+    """
+    global _law_remover
+    if _law_remover is None:
+        _law_remover = LawRemover()
+    gi_statement, public_law, laws = _law_remover.remove(gi_statement)
+    if return_laws:
+        return gi_statement, public_law, laws
     return gi_statement, public_law
 
-def findAgency(gi_statement, agencies, nih_institutes):
-    import re
-    import string
+class AgencyMatcher:
+    """Find the agencies mentioned in a government-interest statement
     
-    def wordFinder(word, string):
-        if re.search(r"\b" + re.escape(word) + r"\b", string):
-            return True
-        return False
+    The names of the agencies (acronyms, acronyms preceded by 'US', titles 
+     and titles with 'dept' in place of 'department') are indexed once by 
+     their first word. Each statement is then scanned word by word and 
+     only the names that start with one of its words are compared with it.
+    This produces the same output that, before, required up to four 
+     regex searches for each agency.
+    The index can be restored from the 'state' of another AgencyMatcher 
+     built from the same dataframes (see build_resource_bundle)
+    """
     
-    punctuation = string.punctuation.replace('-','')
+    def __init__(self, agencies, nih_institutes, state=None):
+        # TODO
+        # This class assumes specific names for the columns of the two 
+        #  dataframes: Must be generalised
+        
+        self.agencies = agencies
+        self.nih_institutes = nih_institutes
+        
+        punctuation = string.punctuation.replace('-','')
+        no_punctuation = str.maketrans('', '', punctuation)
+        # Remove the dots to avoid problems with institutions reported
+        #  like N.A.S.A. instead of as NASA
+        self._statement_table = str.maketrans(
+            {c:(None if c=='.' else ' ') for c in punctuation+'.'})
+        self._spaces = re.compile('\s+')
+        self._word_run = re.compile('\w+')
+        self._word_char = re.compile('\w')
+        darpae = '(advanced research projects agency|ARPA)\s*(E|energy)'
+        darpa = '(advanced research projects agency|ARPA)'
+        self._darpae = re.compile(darpae)
+        self._darpa = re.compile(darpa)
+        
+        if state is not None:
+            (self._agencies, self._index, self._index_low, 
+             fallback, fallback_low) = state
+            self._fallback = [(re.compile(pattern), label) 
+                              for pattern, label in fallback]
+            self._fallback_low = [(re.compile(pattern), label) 
+                                  for pattern, label in fallback_low]
+            return
+        
+        # The acronyms are searched in the original statement, 
+        #  the titles in its lowercase version
+        self._index, self._index_low = {}, {}
+        self._fallback, self._fallback_low = [], []
+        
+        self._agencies = []
+        for acnm, title in zip(agencies.ACNM, agencies.TITLE):
+            acnm = acnm.translate(no_punctuation)
+            title = title.lower().translate(no_punctuation)
+            if acnm=='DARPA':
+                continue
+            label = ('agency', len(self._agencies))
+            self._agencies.append(acnm)
+            self._add(acnm, label)
+            self._add('US'+acnm, label)
+            self._add(title, label, low=True)
+            self._add(title.replace('department','dept'), label, low=True)
+        self._add('Army', 'USA')
+        self._add('Navy', 'USN') # or 'office of naval research'
+        self._add('Air Force', 'USAF')
+        self._add('National Institute of Health', 'NIH')
+        for acnm, title in zip(nih_institutes.ACNM, nih_institutes.TITLE):
+            acnm = acnm.translate(no_punctuation)
+            title = title.lower().translate(no_punctuation)
+            self._add(acnm, 'NIH institute')
+            self._add(title, 'NIH institute', low=True)
     
-    # TODO
-    # This function assumes specific names for the columns of the two 
-    #  dataframes: Must be generalised
-    
-    # Remove the dots to avoid problems with institutions reported
-    #  like N.A.S.A. instead of as NASA
-    gi_statement = gi_statement.replace('.','')
-    for i in punctuation:
-        gi_statement = gi_statement.replace(i,' ')
-    gi_statement = re.sub('\s+', ' ', gi_statement)
-    #gi_statement = gi_statement.translate(
-    #    str.maketrans('', '', punctuation))
-    gi_statement_low = gi_statement.lower()
-    agencies.TITLE = agencies.TITLE.str.lower()
-    agencies = agencies.applymap(lambda col: col.translate(
-        str.maketrans('', '', punctuation)))
-    agencies = agencies[agencies.ACNM!='DARPA']
-    nih_institutes.TITLE = nih_institutes.TITLE.str.lower()
-    nih_institutes = nih_institutes.applymap(lambda col: col.translate(
-        str.maketrans('', '', punctuation)))
-        
-    ags = []
-    for idx,agency in agencies.iterrows():
-        if (wordFinder(agency[0],gi_statement) or
-            wordFinder('US'+agency[0],gi_statement) or
-            wordFinder(agency[1],gi_statement_low) or
-            wordFinder(agency[1].replace('department','dept'),
-                       gi_statement_low)):
-            ags.append(agency[0])
-    if wordFinder('Army',gi_statement):
-        ags.append('USA')
-    if wordFinder('Navy',gi_statement): # or wordFinder('office of naval research',gi_statement_low)
-        ags.append('USN')
-    if wordFinder('Air Force',gi_statement):
-        ags.append('USAF')
-    if 'NIH' not in ags:
-        if wordFinder('National Institute of Health',gi_statement):
-            ags.append('NIH')
+    def state(self):
+        """Return the index, that can be pickled and passed as 'state' 
+        to build the same AgencyMatcher again
+        """
+        return (self._agencies, self._index, self._index_low, 
+                [(pattern.pattern, label) 
+                 for pattern, label in self._fallback], 
+                [(pattern.pattern, label) 
+                 for pattern, label in self._fallback_low])
+    
+    def _add(self, name, label, low=False):
+        index = self._index_low if low else self._index
+        fallback = self._fallback_low if low else self._fallback
+        first_word = self._word_run.match(name)
+        if first_word is None or self._word_char.match(name[-1:]) is None:
+            # The names that don't start and end with a letter or a number 
+            #  are (rare) corner cases where the word boundaries 
+            #  don't coincide with the words of the statement
+            fallback.append((re.compile(r"\b" + re.escape(name) + r"\b"), 
+                             label))
         else:
-            for idx,agency in nih_institutes.iterrows():
-                if (wordFinder(agency[0],gi_statement) or
-                    wordFinder(agency[1],gi_statement_low)):
-                    ags.append('NIH')
-    if 'NRSA' in ags: # This should be generalized to any case in which there is a sub-agency of another agency already present in the list (e.g. ONR)
-        ags = [a.replace('NRSA','NIH') for a in ags]
-    darpae = '(advanced research projects agency|ARPA)\s*(E|energy)'
-    darpa = '(advanced research projects agency|ARPA)'
-    if (re.search(darpae,gi_statement.replace('-','')) is not None or
-        re.search(darpae,gi_statement_low.replace('-','')) is not None):
-        ags.append('DOE')
-    elif (re.search(darpa,gi_statement) is not None or
-          re.search(darpa,gi_statement_low) is not None):
-        ags.append('DARPA')
-    
-    ags = set(ags)
-    ags = '|'.join(ags)
-    return ags
+            index.setdefault(first_word.group(), []).append((name, label))
+    
+    def _scan(self, text, index, fallback):
+        found = set()
+        words = [(m.start(), m.group()) for m in self._word_run.finditer(text)]
+        ends = {start+len(word) for start,word in words}
+        for start,word in words:
+            for name,label in index.get(word, ()):
+                if (label not in found and
+                    text.startswith(name, start) and 
+                    start+len(name) in ends):
+                    found.add(label)
+        for pattern,label in fallback:
+            if label not in found and pattern.search(text):
+                found.add(label)
+        return found
+    
+    def find(self, gi_statement):
+        gi_statement = gi_statement.translate(self._statement_table)
+        gi_statement = self._spaces.sub(' ', gi_statement)
+        gi_statement_low = gi_statement.lower()
+        
+        found = (self._scan(gi_statement, self._index, self._fallback) | 
+                 self._scan(gi_statement_low, 
+                            self._index_low, self._fallback_low))
+        
+        ags = [acnm for i,acnm in enumerate(self._agencies)
+               if ('agency', i) in found]
+        for special in ['USA','USN','USAF']:
+            if special in found:
+                ags.append(special)
+        if 'NIH' not in ags:
+            if 'NIH' in found or 'NIH institute' in found:
+                ags.append('NIH')
+        if 'NRSA' in ags: # This should be generalized to any case in which there is a sub-agency of another agency already present in the list (e.g. ONR)
+            ags = [a.replace('NRSA','NIH') for a in ags]
+        if (self._darpae.search(gi_statement.replace('-','')) is not None or
+            self._darpae.search(gi_statement_low.replace('-','')) is not None):
+            ags.append('DOE')
+        elif (self._darpa.search(gi_statement) is not None or
+              self._darpa.search(gi_statement_low) is not None):
+            ags.append('DARPA')
+        
+        ags = set(ags)
+        ags = '|'.join(ags)
+        return ags
+
+_agency_matcher = None
+
+def findAgency(gi_statement, agencies, nih_institutes):
+    # The AgencyMatcher is built only the first time that these 
+    #  dataframes are seen (note that they are not modified)
+    global _agency_matcher
+    if (_agency_matcher is None or 
+        _agency_matcher.agencies is not agencies or
+        _agency_matcher.nih_institutes is not nih_institutes):
+        _agency_matcher = AgencyMatcher(agencies, nih_institutes)
+    return _agency_matcher.find(gi_statement)
 
 def findCity(df, city):
     # TODO
@@ -260,6 +509,34 @@ def findCity(df, city):
         return city
     return None
 
+def _findCitiesChunk(matcher, statements):
+    cities = set()
+    for s in statements:
+        if isinstance(s, str):
+            cities |= matcher.findall(s)
+    return cities
+
+def findCities(statements, cities, n_cores=1):
+    """Return the set of the cities mentioned in at least one statement
+    
+    Differently from findCity(), that scans all the statements for each 
+     city, the statements are scanned only once, looking for all the 
+     cities at the same time (see KeywordMatcher). With n_cores>1, 
+     the statements are split in chunks scanned in parallel
+    """
+    from functools import partial
+    
+    matcher = KeywordMatcher(cities)
+    statements = list(statements)
+    if n_cores<=1:
+        return _findCitiesChunk(matcher, statements)
+    chunksize = -(-len(statements)//n_cores)
+    chunks = [statements[i:i+chunksize] 
+              for i in range(0, len(statements), chunksize)]
+    with mp.Pool(n_cores) as pool:
+        cts = pool.map(partial(_findCitiesChunk, matcher), chunks)
+    return set().union(*cts)
+
 def removeShorter(award_ids):
     award_ids.sort(key=len)
     award_ids_ = award_ids[:]
@@ -269,117 +546,396 @@ def removeShorter(award_ids):
     award_ids = sorted(award_ids)
     return award_ids
 
-def removeDates(s):
-    import re
+class DateRemover:
+    """Remove the dates (like Dec. 16, 2019 or 12/16/19) from a text
+    
+    The patterns of the twelve months are compiled once. They are still 
+     applied one month after the other (removing a date can make another 
+     one match, so a single alternation would not give the same results), 
+     but only for the months whose name (or number followed by a '/') 
+     appears in the text. Since the dates are replaced with a blank space, 
+     the removals can't create new month names or numbers
+    """
     
     months = ['January','February','March',
               'April','May','June','July',
               'August','September','October',
               'November','December']
-    for month_idx,month in enumerate(months):
-        month_ = month[:]
-        month = f'[{month[:1]}{month[:1].lower()}]{month[1:3]}'
-        if len(month_)>3:
-            month = f'{month}[{month_[3:]}\.]?'
-        day = '(0?[1-9]|[12]\d|3[01])'
-        year = '(19|20)\d{2}(?!\d)'
-        date = f'{month} ({day}(-{day})?,\s)?{year}'
-        s = re.sub(date,' ',s)
-        
-        month_idx += 1
-        if month_idx<10:
-            month_idx = f'0?{month_idx}'
+    
+    def __init__(self):
+        self._patterns = []
+        for month_idx,month in enumerate(self.months):
+            month_ = month[:]
+            month = f'[{month[:1]}{month[:1].lower()}]{month[1:3]}'
+            if len(month_)>3:
+                month = f'{month}[{month_[3:]}\.]?'
+            day = '(0?[1-9]|[12]\d|3[01])'
+            year = '(19|20)\d{2}(?!\d)'
+            date = f'{month} ({day}(-{day})?,\s)?{year}'
+            
+            month_idx += 1
+            if month_idx<10:
+                month_idx = f'0?{month_idx}'
+            else:
+                month_idx = str(month_idx)
+            year = '(19|20)?\d{2}'
+            date_idx = f'\s\(?{month_idx}/{day}/{year}[\),;:\.]?\s'
+            self._patterns.append((re.compile(date), re.compile(date_idx)))
+        # The lookaheads find also the overlapping matches (e.g., in 'janov')
+        self._month_idxs = {month[:3].lower():month_idx 
+                            for month_idx,month in enumerate(self.months)}
+        initials = ''.join(f'{c.upper()}{c}' 
+                           for c in sorted({m[:1] for m in self._month_idxs}))
+        endings = '|'.join(sorted({m[1:] for m in self._month_idxs}))
+        self._month_names = re.compile(f'(?=([{initials}](?:{endings})))')
+        self._month_numbers = re.compile('(?=(\d{1,2})/)')
+        self._spaces = re.compile('\s+')
+    
+    def remove(self, s):
+        names = {self._month_idxs.get(n[:1].lower()+n[1:]) 
+                 for n in self._month_names.findall(s)}
+        numbers = {int(n) for n in self._month_numbers.findall(s)}
+        for month_idx,(date,date_idx) in enumerate(self._patterns):
+            name = month_idx in names
+            number = (month_idx+1) in numbers
+            if name:
+                s = date.sub(' ',s)
+            if number:
+                s = date_idx.sub(' ',s)
+            # The blank spaces are always collapsed after January,
+            #  later only if some pattern has been applied
+            if month_idx==0 or name or number:
+                s = self._spaces.sub(' ',s)
+        return s
+
+_date_remover = None
+
+def removeDates(s):
+    global _date_remover
+    if _date_remover is None:
+        _date_remover = DateRemover()
+    return _date_remover.remove(s)
+
+class KeywordMatcher:
+    """Find which keywords, out of a (possibly long) list, occur in a text
+    
+    The keywords are stored in a character trie that is also translated 
+     into a regular expression. The regex finds, in a single scan, 
+     the positions where at least one keyword starts; then, the trie is 
+     walked only from these positions to collect all the keywords that 
+     start there (also the overlapping ones, as str.find would do).
+    The trie and the regex can be restored from the 'state' of another 
+     KeywordMatcher, without walking the keywords again
+    """
+    
+    # The regex covers only the first characters of the keywords: the trie 
+    #  checks the rest anyway, and a regex of all the characters of 
+    #  thousands of keywords takes some tenths of a second to be compiled
+    regex_depth = 3
+    
+    def __init__(self, keywords=(), state=None):
+        if state is not None:
+            self.trie, self._regex = state
+        else:
+            self.trie = {}
+            for keyword in keywords:
+                if len(keyword)==0:
+                    continue
+                node = self.trie
+                for c in keyword:
+                    node = node.setdefault(c, {})
+                node[''] = keyword
+            self._regex = self._toRegex(self.trie, self.regex_depth) \
+                if self.trie else None
+        if self._regex is None:
+            self._pattern = None
         else:
-            month_idx = str(month_idx)
-        year = '(19|20)?\d{2}'
-        date_idx = f'\s\(?{month_idx}/{day}/{year}[\),;:\.]?\s'
-        s = re.sub(date_idx,' ',s)
-        s = re.sub('\s+',' ',s)
+            self._pattern = re.compile(f'(?={self._regex})')
     
-    return s
+    def state(self):
+        return self.trie, self._regex
+    
+    def _toRegex(self, node, depth):
+        # The regex must only tell whether some keyword may start at a given 
+        #  position, so the shortest keyword is enough to stop the search
+        if '' in node or depth==0:
+            return ''
+        branches = [re.escape(c) + self._toRegex(child, depth-1)
+                    for c, child in sorted(node.items())]
+        if len(branches)==1:
+            return branches[0]
+        return f"(?:{'|'.join(branches)})"
+    
+    def findall(self, text):
+        found = set()
+        if self._pattern is None:
+            return found
+        for match in self._pattern.finditer(text):
+            node = self.trie
+            for c in text[match.start():]:
+                node = node.get(c)
+                if node is None:
+                    break
+                if '' in node:
+                    found.add(node[''])
+        return found
+
+class ZipcodeRemover:
+    """Remove from a statement the zip codes of the US cities it mentions
+    
+    The cities are indexed once with a KeywordMatcher, so each statement 
+     is scanned once and only the zip code patterns of the cities that 
+     are actually mentioned are applied (each of them is compiled 
+     the first time it is needed).
+    The index can be restored from the 'state' of another ZipcodeRemover 
+     built from the same dataframe (see build_resource_bundle)
+    """
+    
+    def __init__(self, zipcodes, state=None):
+        # TODO
+        # This assumes a specific name for the columns, must be generalized
+        
+        self.zipcodes = zipcodes
+        self._compiled_zips = {}
+        if state is not None:
+            self._zips, self._rows, cities = state
+            self._cities = KeywordMatcher(state=cities)
+            return
+        self._zips = []
+        self._rows = {}
+        for i, (city, zc) in enumerate(zip(zipcodes.City, zipcodes.Zipcode)):
+            self._zips.append(f'({zc})(-\d{{4}})?')
+            self._rows.setdefault(city, []).append(i)
+        self._cities = KeywordMatcher(self._rows.keys())
+    
+    def state(self):
+        """Return the index, that can be pickled and passed as 'state' 
+        to build the same ZipcodeRemover again
+        """
+        return self._zips, self._rows, self._cities.state()
+    
+    def _zipPattern(self, i):
+        pattern = self._compiled_zips.get(i)
+        if pattern is None:
+            pattern = re.compile(self._zips[i])
+            self._compiled_zips[i] = pattern
+        return pattern
+    
+    def _findRows(self, s, after=-1):
+        return sorted(i for city in self._cities.findall(s)
+                      for i in self._rows[city] if i>after)
+    
+    def remove(self, s):
+        s = s.replace('Redstone Arsenal','Huntsville')
+        rows = self._findRows(s)
+        k = 0
+        while k<len(rows):
+            i = rows[k]
+            k += 1
+            s_ = self._zipPattern(i).sub('',s)
+            if s_!=s:
+                s = s_
+                # Removing a zip code can (rarely) join two pieces of text 
+                #  into the name of another city
+                rows = self._findRows(s, after=i)
+                k = 0
+        return s
+
+_zipcode_remover = None
 
 def removeZip(s, zipcodes):
-    # TODO
-    # This assumes a specific name for the columns, must be generalized
-    import re
-    s = s.replace('Redstone Arsenal','Huntsville')
-    for idx, zipcode in zipcodes.iterrows():
-        if s.find(zipcode['City'])!=-1:
-            zc = zipcode['Zipcode']
-            target = f'({zc})(-\d{{4}})?'
-            s = re.sub(target,'',s)
-    return s
+    # The ZipcodeRemover is built only the first time that 
+    #  this dataframe is seen
+    global _zipcode_remover
+    if _zipcode_remover is None or _zipcode_remover.zipcodes is not zipcodes:
+        _zipcode_remover = ZipcodeRemover(zipcodes)
+    return _zipcode_remover.remove(s)
+
+# HTML entities that are decoded differently from the HTML standard, 
+#  because of the conventions of the USPTO texts or of OCR mistakes
+ocr_entities = {'mdash':'-',
+                'ldquo':"'",
+                'rdquo':"'",
+                'Ovalhollow':'', # probably an OCR mistake
+                'Oslash':'0', # should be Ø but is a mistake of the OCR
+                'Prime':"'",
+                'times':'x',
+                'copy':'(c)'}
+# The Greek letters of the ISO 8879 entities (like &mgr;) used by the USPTO
+for k, letter in [('a','alpha'), ('b','beta'), ('g','gamma'), ('d','delta'),
+                  ('e','epsilon'), ('z','zeta'), ('ee','eta'), 
+                  ('th','theta'), ('i','iota'), ('k','kappa'), 
+                  ('l','lambda'), ('m','mu'), ('n','nu'), ('x','xi'), 
+                  ('o','omicron'), ('p','pi'), ('r','rho'), ('s','sigma'), 
+                  ('t','tau'), ('u','upsilon'), ('ph','phi'), ('kh','chi'), 
+                  ('ps','psi'), ('oh','omega')]:
+    ocr_entities[f'{k}gr'] = letter
+    ocr_entities[f'{k.upper()}gr'] = letter.title()
+ocr_entities['sfgr'] = 'sigma'
+del k, letter
+
+class TextNormalizer:
+    """Normalize the text of a statement before the extraction
+    
+    It adds a space where it is missing after ;:) and before (, decodes 
+     the HTML entities (all the HTML5 ones, the numeric ones and the 
+     ones in ocr_entities, that take precedence), replaces the double 
+     hyphens and the dashes with a hyphen and collapses the white spaces. 
+    The entities are decoded in a single scan (before, ~20 scans were 
+     needed, one for each of the entities known) and each of the other 
+     steps is done only if the text contains the characters involved. 
+    normalize_series() does the same over a whole pd.Series at once, 
+     normalizing all its statements joined in a single string
+    """
+    
+    # Increase it when a change to the normalization changes its output 
+    #  (it is part of the fingerprint of AwardIdCache)
+    version = '2'
+    
+    dashes = '\u2010\u2011\u2012\u2013\u2014\u2015\u2212'
+    # Used to join the statements in normalize_series(), 
+    #  it is not changed by any step of the normalization
+    separator = '\0'
+    
+    def __init__(self):
+        from html import unescape
+        from html.entities import html5
+        
+        self._unescape = unescape
+        self.entities = {name[:-1]:char for name, char in html5.items() 
+                         if name.endswith(';')}
+        self.entities.update(ocr_entities)
+        # The patterns start with the punctuation, so that they are 
+        #  searched quickly
+        self._missing_space = [
+            (c, re.compile(re.escape(c) + '(?=[A-Za-z0-9])'), c + ' ') 
+            for c in ';:)']
+        self._missing_space.append(
+            ('(', re.compile(r'\((?<=[A-Za-z0-9]\()'), ' ('))
+        self._entity = re.compile(
+            r'&(?:([A-Za-z][A-Za-z0-9]*)|#[0-9]+|#[xX][0-9A-Fa-f]+);')
+    
+    def _decode(self, match):
+        name = match.group(1)
+        if name is None:
+            return self._unescape(match.group())
+        return self.entities.get(name, match.group())
+    
+    def decode(self, text):
+        if text.find('&')==-1:
+            return text
+        return self._entity.sub(self._decode, text)
+    
+    def _collapseSpaces(self, s):
+        # Same as re.sub('\s+', ' ', s), but faster. All the white spaces, 
+        #  but ' ', are not printable, so the printable strings without 
+        #  double spaces don't need to be changed
+        if s.isprintable() and s.find('  ')==-1:
+            return s
+        collapsed = ' '.join(s.split())
+        if len(collapsed)==0:
+            return s[:1] and ' '
+        if s[0].isspace():
+            collapsed = ' ' + collapsed
+        if s[-1].isspace():
+            collapsed = collapsed + ' '
+        return collapsed
+    
+    def _normalize(self, s):
+        # The spaces are added before decoding the entities, since 
+        #  the entities themselves end with a ;
+        for c, pattern, replacement in self._missing_space:
+            if c in s:
+                s = pattern.sub(replacement, s)
+        s = self.decode(s)
+        s = s.replace('--','-')
+        for c in self.dashes:
+            if c in s:
+                s = s.replace(c,'-')
+        return s
+    
+    def normalize(self, s):
+        return self._collapseSpaces(self._normalize(s))
+    
+    def normalize_series(self, series):
+        """Return a copy of 'series' with its strings normalized"""
+        statements = series.tolist()
+        idxs = [i for i, s in enumerate(statements) if isinstance(s, str)]
+        joined = self.separator.join(statements[i] for i in idxs)
+        if joined.count(self.separator)==max(len(idxs)-1, 0):
+            normalized = self._normalize(joined).split(self.separator)
+        else:
+            # The separator is used in some statement
+            normalized = [self._normalize(statements[i]) for i in idxs]
+        for i, s in zip(idxs, normalized):
+            statements[i] = self._collapseSpaces(s)
+        return pd.Series(statements, index=series.index, name=series.name, 
+                         dtype=series.dtype)
+
+_text_normalizer = None
+
+def getTextNormalizer():
+    global _text_normalizer
+    if _text_normalizer is None:
+        _text_normalizer = TextNormalizer()
+    return _text_normalizer
 
 def htmlTOunicode(text):
-    # TODO
-    # Maybe it could be nicer to consider all the possible html codes (remember that &num; is very important and doesn't seem to be officially part of these codes)
-    translate = {'&mdash;':'-',
-                 '&num;':'#',
-                 '&ldquo;':"'",
-                 '&rdquo;':"'",
-                 '&apos;':"'",
-                 '&amp;':'&',
-                 '&equals;':'=',
-                 '&lsqb;':'[',
-                 '&rsqb;':']',
-                 '&quest;':'?',
-                 '&sect;':'§',
-                 '&Ovalhollow;':'', # probably an OCR mistake
-                 '&Oslash;':'0', # should be Ø but is a mistake of the OCR
-                 '&Prime;':"'",
-                 '&plus;':'+',
-                 '&oacute;':'ó',
-                 '&apos;':"'",
-                 '&times;':'x',
-                 '&copy;':'(c)',
-                 '&mgr;':'mu'} 
-    for k,v in translate.items():
-        text = text.replace(k,v)
-    return text
+    return getTextNormalizer().decode(text)
+
+def normalizeText(s):
+    return getTextNormalizer().normalize(s)
+
+def normalizeTextSeries(series):
+    return getTextNormalizer().normalize_series(series)
+
+_award_ids_list = re.compile('[\s\(]([A-Z]{2})([0-9]{4,7})'
+                             '((, [0-9]{4,7})*),? and ([0-9]{4,7})[\s\)]')
+_digits = re.compile('[0-9]+')
+
+def _modificationRule(gis):
+    gis1 = gis.group(1)
+    gis2 = gis.group(2)
+    gis3 = _digits.findall(gis.group(3))
+    gis4 = gis.groups()[-1:][0]
+    gis = [f'{gis1}+{w}' for w in [gis2] + gis3 + [gis4]]
+    gis = ', '.join(gis)
+    gis = f' {gis} '
+    return gis
 
 def award_ids_modifier(s):
-    import re
-    def modificationRule(gis):
-        gis1 = gis.group(1)
-        gis2 = gis.group(2)
-        gis3 = re.findall('[0-9]+', gis.group(3))
-        gis4 = gis.groups()[-1:][0]
-        gis = [f'{gis1}+{w}' for w in [gis2] + gis3 + [gis4]]
-        gis = ', '.join(gis)
-        gis = f' {gis} '
-        return gis
-    pattern = ('[\s\(]([A-Z]{2})([0-9]{4,7})((, [0-9]{4,7})*),?'
-               ' and ([0-9]{4,7})[\s\)]')
-    s = re.sub(pattern, modificationRule, s)
+    s = _award_ids_list.sub(_modificationRule, s)
     return s
 
+_common_title_pattern = '“.+”'
+_title_patterns = [re.compile(pattern) for pattern in [
+    f'[Ll]abeled:? {_common_title_pattern}',
+    f'([Ee]n)?[Tt]itle(d)?:? {_common_title_pattern}',
+    f'[Uu]nder {_common_title_pattern} ([Pp]rogram|[Cc]ontract)',
+    f'project name:? {_common_title_pattern}']]
+
 def removeTitle(s):
-    import re
-    common_pattern = '“.+”'
-    patterns = [f'[Ll]abeled:? {common_pattern}',
-                f'([Ee]n)?[Tt]itle(d)?:? {common_pattern}',
-                f'[Uu]nder {common_pattern} ([Pp]rogram|[Cc]ontract)',
-                f'project name:? {common_pattern}']
-    for pattern in patterns:
-        s = re.sub(pattern,'',s)
+    for pattern in _title_patterns:
+        s = pattern.sub('',s)
     return s
 
-def removeFile(s, stops):
-    import re
-    import string
-    from nltk.tokenize import RegexpTokenizer
-    from nltk.corpus import words
+# The same tokens returned by nltk's RegexpTokenizer('\w+')
+_file_tokenizer = re.compile('\w+')
+_empty_quotes = re.compile('“\s*”')
+_spaces = re.compile('\s+')
+
+def removeFile(s, stops, dictionary=None):
+    if dictionary is None:
+        dictionary = getEnglishDictionary()
     
     punctuation = string.punctuation
     #punctuation += '—'
     
-    tokenizer = RegexpTokenizer('\w+')
-    
-    tokens = tokenizer.tokenize(s)
+    tokens = _file_tokenizer.findall(s)
     idxs = [i for i,w in enumerate(tokens) if w.lower()=='txt']
     for idx in idxs:
         i = 1
-        while getBasicForm(tokens[idx-i]) not in words.words():
+        while dictionary.basicForm(tokens[idx-i]) not in dictionary:
             i += 1
         idx += 1
         #for w in tokens[idx-i:idx]:
@@ -391,14 +947,11 @@ def removeFile(s, stops):
     for c in stops:
         punctuation = punctuation.replace(c,'')
     #s = re.sub(f'[{punctuation}“”]{{2,}}','',s)
-    s = re.sub('“\s*”','',s)
-    s = re.sub('\s+',' ',s)
+    s = _empty_quotes.sub('',s)
+    s = _spaces.sub(' ',s)
     return s
 
-import multiprocessing as mp
-def award_id_extractor_preprocessor(df, n_cores = mp.cpu_count()-1):
-    import pandas as pd
-    import os
+def award_id_extractor_preprocessor(df, n_cores = os.cpu_count()-1):
     import requests
     
     try:
@@ -414,7 +967,6 @@ def award_id_extractor_preprocessor(df, n_cores = mp.cpu_count()-1):
             not os.path.isfile(f'{folder}/agencies.tsv')):
             print('Create agencies.tsv and/or acronyms.txt')
             from tabula import read_pdf
-            import pandas as pd
             file_name = 'GOVMAN-2018-12-03-Commonly-Used-Agency-Acronyms-105.pdf'
             if not os.path.isfile(f'{folder}/{file_name}'):
                 url = 'https://www.govinfo.gov/content/pkg/GOVMAN-2018-12-03/pdf/'
@@ -500,10 +1052,7 @@ def award_id_extractor_preprocessor(df, n_cores = mp.cpu_count()-1):
             print('nih_institutes.tsv created')
 
         if not os.path.isfile(f'{folder}/zipcodes.tsv'):
-            import re
-            
-            print(('Create zipcodes.tsv\n'
-                   'It takes a lot of time...'))
+            print('Create zipcodes.tsv')
             
             zipcodes_url = \
                 'http://federalgovernmentzipcodes.us/' \
@@ -514,17 +1063,11 @@ def award_id_extractor_preprocessor(df, n_cores = mp.cpu_count()-1):
             zipcodes = zipcodes.Zipcode.apply(lambda x: '|'.join(x))
             zipcodes = zipcodes.reset_index()
             cities = zipcodes.City.tolist()
-            if n_cores==1:
-                cts = [findCity(df, city) for city in cities]
-            else:
-                #import multiprocessing as mp
-                from pathos.multiprocessing import ProcessingPool as Pool
-                from functools import partial
-                pool = mp.Pool(n_cores)
-                cts = pool.map(partial(findCity, df), [city for city in cities])
-                pool.close()
-            cts = list(filter(None.__ne__, cts))
-            cts.append('Huntsville') ###################################################################### 
+            # TODO
+            # This assumes a specific name for the column
+            # Must be generalized
+            cts = findCities(df.gi_statement, cities, n_cores)
+            cts.add('Huntsville') ###################################################################### 
             zipcodes = zipcodes[zipcodes.City.isin(cts)]
             # The zip codes used are probably too uptodate
             #  The following is a very important case, 
@@ -552,295 +1095,884 @@ def award_id_extractor_preprocessor(df, n_cores = mp.cpu_count()-1):
         
     return acronyms, agencies, nih_institutes, zipcodes
 
-def award_id_extractor(s, inputs, current_year=None):
+# Lightweight replacements of the dataframes returned by 
+#  award_id_extractor_preprocessor() (the columns are tuples)
+AgencyTable = namedtuple('AgencyTable', ['ACNM','TITLE'])
+ZipcodeTable = namedtuple('ZipcodeTable', ['City','Zipcode'])
+
+def _column(table, column):
+    # Return a column of a dataframe or of an AgencyTable/ZipcodeTable 
+    #  as a list
+    column = getattr(table, column)
+    if hasattr(column, 'tolist'):
+        return column.tolist()
+    return list(column)
+
+# Increase it when the content of the bundle changes
+RESOURCE_BUNDLE_VERSION = 2
+_resource_files = ['acronyms.txt', 'agencies.tsv', 
+                   'nih_institutes.tsv', 'zipcodes.tsv']
+
+def _md5sum(file_name):
+    try:
+        from .checksum import md5sum
+    except ImportError:
+        from checksum import md5sum
+    
+    return md5sum(file_name)
+
+class ResourceBundle(tuple):
+    """The 'inputs' of award_id_extractor() saved by build_resource_bundle()
+    
+    It is the same tuple (acronyms, agencies, nih_institutes, zipcodes), 
+     with the state of the AgencyMatcher and of the ZipcodeRemover built 
+     from them in 'matchers', so that each AwardIdExtractor (e.g., one in 
+     each worker process) doesn't need to build their indexes again
+    """
+    
+    def __new__(cls, inputs, matchers=None):
+        bundle = super().__new__(cls, inputs)
+        bundle.matchers = matchers or {}
+        return bundle
+
+def build_resource_bundle(df=None, n_cores=1, path=None):
+    """Save the output of award_id_extractor_preprocessor() 
+    in a single pickle file (by default, resources.pkl in the same folder)
+    
+    The dataframes are stored as AgencyTable and ZipcodeTable, 
+     together with the state of the matchers built from them, the version 
+     of the bundle and the md5 checksums of the files they come from. 
+     The 'df' is needed only if some of these files must be created 
+     (see award_id_extractor_preprocessor).
+    It returns the same ResourceBundle that load_resource_bundle() returns
+    """
+    import pickle
+    
+    if path is None:
+        path = f'{folder}/resources.pkl'
+    acronyms, agencies, nih_institutes, zipcodes = \
+        award_id_extractor_preprocessor(df, n_cores)
+    inputs = (
+        list(acronyms),
+        AgencyTable(tuple(_column(agencies, 'ACNM')), 
+                    tuple(_column(agencies, 'TITLE'))),
+        AgencyTable(tuple(_column(nih_institutes, 'ACNM')), 
+                    tuple(_column(nih_institutes, 'TITLE'))),
+        ZipcodeTable(tuple(_column(zipcodes, 'City')), 
+                     tuple(_column(zipcodes, 'Zipcode'))))
+    matchers = {'agency': AgencyMatcher(inputs[1], inputs[2]).state(),
+                'zipcode': ZipcodeRemover(inputs[3]).state()}
+    bundle = {'version': RESOURCE_BUNDLE_VERSION,
+              'checksums': {file_name:_md5sum(f'{folder}/{file_name}') 
+                            for file_name in _resource_files},
+              'inputs': inputs,
+              'matchers': matchers}
+    with open(path, 'wb') as f_out:
+        pickle.dump(bundle, f_out, protocol=pickle.HIGHEST_PROTOCOL)
+    return ResourceBundle(inputs, matchers)
+
+def load_resource_bundle(path=None, validate=True):
+    """Load the 'inputs' of award_id_extractor() saved by 
+    build_resource_bundle() (as a ResourceBundle), without the need of pandas
+    
+    With validate=True, a ValueError is raised if the bundle has been 
+     built by another version of this module or if the md5 checksums 
+     of the source files in the folder (when they exist) have changed
+    """
+    import pickle
+    
+    if path is None:
+        path = f'{folder}/resources.pkl'
+    with open(path, 'rb') as f_in:
+        bundle = pickle.load(f_in)
+    if validate:
+        if bundle['version']!=RESOURCE_BUNDLE_VERSION:
+            raise ValueError(f'{path} has version {bundle["version"]} '
+                             f'instead of {RESOURCE_BUNDLE_VERSION}: '
+                             'run build_resource_bundle() again')
+        for file_name, checksum in bundle['checksums'].items():
+            file_path = f'{folder}/{file_name}'
+            if os.path.isfile(file_path) and _md5sum(file_path)!=checksum:
+                raise ValueError(f'{file_path} has changed since {path} '
+                                 'was built: run build_resource_bundle() again')
+    return ResourceBundle(bundle['inputs'], bundle.get('matchers'))
+
+AwardIdRecord = namedtuple('AwardIdRecord', ['award_id',
+                                             'public_law_statement',
+                                             'awarding_agency_acronymes',
+                                             'potential_year',
+                                             'public_laws'])
+AwardIdRecord.__doc__ = """Result of award_id_extractor(..., record=True)
+    (a lighter alternative to the pd.Series returned by default).
+    public_laws has the families of the laws found in the statement
+    (see LawRemover.families), separated by '|'. The pd.Series and 
+    the dataframes have it only with return_laws=True"""
+
+class AwardIdAccumulator:
+    """Collect many AwardIdRecord column by column
+    
+    The flags are stored in arrays of bytes, and to_frame() builds 
+     the final dataframe at once from the columns 
+     (with the public_laws column only if return_laws=True)
+    """
+    
+    def __init__(self):
+        from array import array
+        
+        self.award_id = []
+        self.public_law_statement = array('b')
+        self.awarding_agency_acronymes = []
+        self.potential_year = array('b')
+        self.public_laws = []
+    
+    def __len__(self):
+        return len(self.award_id)
+    
+    def __iter__(self):
+        for award_id, pl, ags, iy, laws in zip(self.award_id, 
+                                               self.public_law_statement, 
+                                               self.awarding_agency_acronymes, 
+                                               self.potential_year, 
+                                               self.public_laws):
+            yield AwardIdRecord(award_id, bool(pl), ags, bool(iy), laws)
+    
+    def append(self, record):
+        award_id, public_law_statement, ags, potential_year, laws = record
+        self.award_id.append(award_id)
+        self.public_law_statement.append(public_law_statement)
+        self.awarding_agency_acronymes.append(ags)
+        self.potential_year.append(potential_year)
+        self.public_laws.append(laws)
+    
+    def extend(self, other):
+        self.award_id.extend(other.award_id)
+        self.public_law_statement.extend(other.public_law_statement)
+        self.awarding_agency_acronymes.extend(other.awarding_agency_acronymes)
+        self.potential_year.extend(other.potential_year)
+        self.public_laws.extend(other.public_laws)
+    
+    def to_frame(self, index=None, return_laws=False):
+        columns = {
+            'award_id': 
+                np.array(self.award_id, dtype=object),
+            'public_law_statement': 
+                np.frombuffer(self.public_law_statement, dtype=np.bool_),
+            'awarding_agency_acronymes': 
+                np.array(self.awarding_agency_acronymes, dtype=object),
+            'potential_year': 
+                np.frombuffer(self.potential_year, dtype=np.bool_)}
+        if return_laws:
+            columns['public_laws'] = np.array(self.public_laws, dtype=object)
+        return pd.DataFrame(columns, index=index)
+
+class StageTimer:
+    """Accumulate the wall time and the number of calls of each stage
+    of award_id_extractor() over a whole run
+    
+    Pass it as 'timer' to award_id_extractor() (or to the batch functions,
+     award_id_extractor_df and award_id_extractor_stream) and read the
+     results with report() or to_json(). Without a timer, the extractor
+     only checks, at the end of each stage, that it is None
+    """
+    
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self._last = None
+    
+    def start(self):
+        self._last = time.perf_counter()
+    
+    def lap(self, stage):
+        # The time since the end of the previous stage is assigned to 'stage'
+        now = time.perf_counter()
+        self.add(stage, now - self._last)
+        self._last = now
+    
+    def add(self, stage, seconds, calls=1):
+        self.seconds[stage] = self.seconds.get(stage, 0.) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+    
+    def merge(self, other):
+        # E.g., to collect the timers of the worker processes
+        for stage, seconds in other.seconds.items():
+            self.seconds[stage] = self.seconds.get(stage, 0.) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + other.calls[stage]
+    
+    def reset(self):
+        self.seconds.clear()
+        self.calls.clear()
+    
+    def report(self):
+        """Return a dict with the calls, the seconds, the µs per call and
+        the share of the total time of each stage (in the order of
+        the pipeline)
+        """
+        total = sum(self.seconds.values())
+        return {stage: {'calls': self.calls[stage],
+                        'seconds': seconds,
+                        'us_per_call': seconds/self.calls[stage]*1e6,
+                        'share': seconds/total if total>0 else 0.}
+                for stage, seconds in self.seconds.items()}
+    
+    def to_json(self, path=None):
+        import json
+        
+        report = json.dumps(self.report(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f_out:
+                f_out.write(report)
+        return report
+
+class AwardIdExtractor:
+    """Reusable version of award_id_extractor()
+    
+    It is built once from the tuple produced by 
+     award_id_extractor_preprocessor() and keeps everything that 
+     award_id_extractor() would otherwise rebuild for each statement 
+     (i.e., the tokenizer, the compiled regular expressions, the set of 
+     the acronyms and the English dictionary)
+    """
+    
+    stops = '.,;:' #(&/ #QUESTA DECISIONE E' VERAMENTE MOLTO DIFFICILE
+    
+    def __init__(self, inputs):
+        from nltk.tokenize import RegexpTokenizer
+        
+        stops = self.stops
+        
+        self.inputs = inputs
+        acronyms, agencies, nih_institutes, zipcodes = inputs
+        
+        # This is a patch, since I forgot to add the nih_institutes to the 
+        #  acronyms list. It must be definitively fixed in the 
+        #  award_id_extractor_preprocessor function
+        self.acronyms = frozenset(acronyms + _column(nih_institutes, 'ACNM'))
+        self.agencies = agencies
+        self.nih_institutes = nih_institutes
+        self.zipcodes = zipcodes
+        self.dictionary = getEnglishDictionary()
+        # The matchers prebuilt in a ResourceBundle, if any, are reused
+        matchers = getattr(inputs, 'matchers', {})
+        self.agency_matcher = AgencyMatcher(agencies, nih_institutes, 
+                                            matchers.get('agency'))
+        self.zipcode_remover = ZipcodeRemover(zipcodes, 
+                                              matchers.get('zipcode'))
+        
+        #tokenizer = RegexpTokenizer(r'[-,\w]+')
+        self.tokenizer = RegexpTokenizer(f'[-/&{stops}\w]+') #/ #QUESTA DECISIONE E' VERAMENTE MOLTO DIFFICILE valutare se tenere unite le parole separate da / o meno!
+        
+        self.normalizer = getTextNormalizer()
+        self._patent_numbers = [
+            re.compile(('((Ser|Pat)(ent|\.)? (No\.?|[Aa]pplication)|S\.?N\.?)'
+                        ' (\d{1,2}[/,])?\d{3}[/,]\s?\d{3}')),
+            re.compile('\d{2}/\d{3},\d{3}'),
+            re.compile('PCT[/\s]([A-Z]{2}|W0)\d{2,4}/\d{5,6}')]
+        self._po_box = re.compile('P.O. Box \d+')
+        self._licensing = re.compile(('Licensing (and technical )?inquiri?es'
+                                      ' may be directed to .+\.(mil|gov)\.?'))
+        self._navy_calif = re.compile(('[Cc]ode \d{4,5}|'
+                                       'D0012|53510|53560|'
+                                       '(619)?\)?[-\s]?553-\d{4}|'
+                                       '[\w.]+@[\w.]*navy\.mil|'
+                                       '(([Rr]eferenc(e|ing)\s)|'
+                                       '([Nn]avy [Cc]ase\s)|'
+                                       '(NC\s))+(Number|No\.?)?\s?[\d\,\.]{5,7}'))
+        self._navy_sc = re.compile(('[Cc]ode [A-Z0-9\-]+|'
+                                    '29419(-9022)?|'
+                                    '(843)?\)?[-\s]?218-\d{4}|'
+                                    '[\w.]+@[\w.]*navy\.mil|'
+                                    '(([Rr]eferenc(e|ing)\s)|'
+                                    '([Nn]avy [Cc]ase\s)|'
+                                    '(NC\s))+(Number|No\.?)?\s?[\d\,\.]{5,7}'))
+        self._navy_case = re.compile(('(([Rr]eferenc(e|ing)\s)|([Nn]avy [Cc]ase\s)|'
+                                      '(NC\s))+(Number|No\.?)?\s?[\d\,\.]{5,7}'))
+        self._eng = re.compile('-[Ee]ng\.?-?')
+        self._title = re.compile(r'^(0?[1-9][\s\.]{1,3})?\b[A-Z&\s-]+\b')
+        self._ampersand = re.compile(
+            f'(?![\s\(][A-Z]+)&(?![A-Z]+[\s\){stops}])')
+        self._slash = re.compile(r'(\b[A-Z]+)/([A-Z]+\b)')
+        self._words = re.compile(r'\b[A-Z]?[a-z]+(-[A-Z]?[a-z]+)?\b')
+        self._stops_table = str.maketrans('','',stops)
+    
+    def extract(self, s, current_year=None, record=False, timer=None, 
+                normalized=False, return_laws=False):
+        """With record=True, an AwardIdRecord is returned 
+        in place of a pd.Series. 
+        With return_laws=True, the pd.Series has also the families 
+        of the laws found ('public_laws', as in AwardIdRecord). 
+        A StageTimer can be passed as 'timer' to measure each stage. 
+        With normalized=True, s must have already been normalized 
+        (see normalizeText and normalizeTextSeries)
+        """
+        if timer is not None:
+            timer.start()
+        
+        acronyms = self.acronyms
+        dictionary = self.dictionary
+        stops = self.stops
+        
+        if current_year is None or np.isnan(current_year):
+            now = datetime.datetime.now()
+            current_year = now.year
+        
+        # Add a space near the punctuation when it is missing, fix html 
+        #  char. codes, replace consecutive hyphens and dashes with 
+        #  a hyphen and remove the double blank spaces 
+        #  (already done, if the statements are normalized in batch)
+        if not normalized:
+            s = self.normalizer.normalize(s)
+            if timer is not None:
+                timer.lap('normalization')
+        # Find the agency to help the matching
+        ags = self.agency_matcher.find(s)
+        if timer is not None:
+            timer.lap('agency')
+        
+        # Remove the text related to the 'CROSS-REFERENCE TO RELATED APPLICATIONS' 
+        #  section that is, sometimes, erroneously reported after the government 
+        #  statement section. Moreover, also the patent numbers are removed
+        for pattern in self._patent_numbers:
+            s = pattern.sub('',s)
+        if timer is not None:
+            timer.lap('patent_numbers')
+        # Remove the parts related to laws
+        s,pl,laws = excludeLaws(s, return_laws=True)
+        # The families of the laws found, separated by "|" 
+        #  (see LawRemover.families)
+        laws = '|'.join(laws)
+        if timer is not None:
+            timer.lap('laws')
+        # Remove the zip codes of the US cities
+        s = self.zipcode_remover.remove(s)
+        # Remove post office box number
+        s = self._po_box.sub('',s)
+        if timer is not None:
+            timer.lap('zipcodes')
+        
+        # Remove dates from the text (like Dec. 16, 2019)
+        s = removeDates(s)
+        if timer is not None:
+            timer.lap('dates')
+        # Remove title of the project
+        s = removeTitle(s)
+        if timer is not None:
+            timer.lap('title')
+        # Remove name of files like xxx.txt
+        if s.find('.txt')!=-1:
+            s = removeFile(s, stops=stops, dictionary=dictionary)
+            if timer is not None:
+                timer.lap('files')
+        
+        # Remove some words from few specific cases that are particularly 
+        #  complicated. This portion of code comes mostly from the USPTO script 
+        #  that you can find here: 
+        #  https://github.com/CSSIP-AIR/government-interest-parsing/
+        #   blob/master/NER.py
+        
+        len_check = len(s)
+        s = self._licensing.sub('',s)
+        if (s.find('Legal Counsel')!=-1 or
+             s.find('Space and Naval Warfare Systems')!=-1):
+            if s.find('Calif')!=-1:
+                s = self._navy_calif.sub('',s)
+            elif  s.find('S.C.')!=-1:
+                s = self._navy_sc.sub('',s)
+        if len_check > len(s):
+            s = self._navy_case.sub('',s)
+        
+        if s.find('Environmental Protection Agency')!=-1:
+            s = s.replace('1025 F St','')
+        s = s.replace(('(COOPERATIVE RESEARCH AND TECHNOLOGY ENHANCEMENT '
+                       'ACT OF 2004 (CREATE ACT) (PUB. L. 108-453, 118 STAT.'
+                       ' 3596 (2004))'),'')
+        s = s.replace('CIRID at UCLA','')
+        
+        # Replace Eng or eng with ENG (it appears in some award ids)
+        s = self._eng.sub('-ENG-',s)
+        if timer is not None:
+            timer.lap('special_cases')
+        
+        # Remove all the words with only upper cases at the beginning of the sentence
+        #  (in most, if not all, of the cases they are titles)
+        s = self._title.sub('', s)
+        # Remove the punctuation
+        s = removePunctuation(s, f'-&#/{stops}')
+        # Transforme & in "and" if there are spaces on both sizes
+        #  and than transform & in a comma and a space if it is not surrounded by 
+        #  uppercases only (as in acronymes)
+        s = s.replace(' & ',' and ')
+        s = self._ampersand.sub(', ',s)
+        # Replace AAA/BBB with AAA BBB
+        s = self._slash.sub(lambda w: w.group(1) + ' ' + w.group(2),s)
+        # Replace # with a blank space
+        s = s.replace('#',' ')
+        if timer is not None:
+            timer.lap('punctuation')
+        # Replace "AA1111, 2222 and 3333" with "AA+1111, AA+2222 and AA+3333"
+        s = award_ids_modifier(s)
+        if timer is not None:
+            timer.lap('award_ids_modifier')
+        # Tokenise
+        tokens = self.tokenizer.tokenize(s)
+        # Remove words with only letters and, eventually, a dash
+        # (we are looking for things with numbers and, eventually, capital letters)
+        s = self._words.sub('',s)
+        s = self.tokenizer.tokenize(s)
+        # Remove the word 'U.S.'
+        s = list(filter(('U.S.').__ne__, s))
+        # Remove words with only one letter that is not a number
+        s = [w for w in s if ((len(w)>2 and w[-1:] in stops) or 
+                              len(w)>1 or 
+                              w.isnumeric())]
+        if timer is not None:
+            timer.lap('tokenization')
+        # Remove the words that are contained in the acronyms list
+        s = [w for w in s if not isAcronym(w, acronyms)]
+        if timer is not None:
+            timer.lap('acronyms')
+        # Preserve only words (one among these cases)
+        #  - that are shorter than 3 characters with only uppercases
+        #  - that contain at least one number
+        #  - whose basic form (see above) is not in the English dictionary
+        s = [w for w in s if includeWord(w, dictionary)]
+        if timer is not None:
+            timer.lap('dictionary')
+        # Look at the word immediately before or after the one identified as 
+        #  potential award ids and, if it's not an acronym, add it to the potential
+        #  award ids with a '+' in between (look at the addIsolated function 
+        #  for further details)
+        s_add = []
+        expander = IsolatedExpander(tokens, s, acronyms, stops, dictionary)
+        idxs = []
+        for ws in set(s):
+            idxs.extend(expander.positions(ws))
+        for forward in [False, True]:
+            for idx in idxs:
+                w = expander.expand(idx, forward)
+                if isinstance(w, list):
+                    s_add.extend(w)
+                else:
+                    s_add.append(w)
+        if timer is not None:
+            timer.lap('addIsolated')
+        s = set(s + s_add)
+        s = [w.translate(self._stops_table) for w in s]
+        # Remove any potential award id shorter than 4 char. and 
+        #  that doesn't contain numbers
+        s = [w for w in s if (len(removePunctuation(w))>4 and 
+                              any(c.isdigit() for c in w))]
+        # Add a "flag", if any of the potential award ids is a potential year 
+        #  (i.e., essentially a 19 or 20 followed by other 2 digits; 
+        #  for further details look at the isYear function) 
+        iy = any([isYear(w, current_year) for w in s])
+        # Remove the award ids contained in other (longer) award ids
+        s.sort(key=len)
+        for i,w in enumerate(s[:]):
+            if any(w in o for o in s[i+1:]):
+                s.remove(w)
+        # Join the potential award ids detected in a string separated by "|"
+        if len(s)==0:
+            s = ['']
+        else:
+            s = removeShorter(s)
+        s = '|'.join(s)
+        if timer is not None:
+            timer.lap('dedup')
+        
+        if record:
+            result = AwardIdRecord(s, pl, ags, iy, laws)
+        else:
+            result = {
+                'award_id': s,
+                'public_law_statement': pl,
+                'awarding_agency_acronymes': ags,
+                'potential_year':iy}
+            if return_laws:
+                result['public_laws'] = laws
+            result = pd.Series(result)
+        if timer is not None:
+            timer.lap('output')
+        return result
+
+_extractor = None
+
+def award_id_extractor(s, inputs, current_year=None, record=False, 
+                       timer=None, normalized=False, return_laws=False):
     """the 'inputs' are a tuple with the four variables produced by 
     award_id_extractor_preprocessor() and is mandatory
+    (an AwardIdExtractor built from them can be passed as well)
+    With record=True, an AwardIdRecord is returned in place of a pd.Series
+    The time spent in each stage is added to 'timer', if it is a StageTimer
+    With normalized=True, s must have already been normalized (see normalizeText)
+    With return_laws=True, the pd.Series has also the families of the laws found
     """
-    import numpy as np
-    import pandas as pd
-    import re
-#     import string
-    from nltk.corpus import words
-    from nltk.tokenize import RegexpTokenizer
+    global _extractor
     
     # TODO
     # I think it is not a very elegant way to solve this problem,
     #  since it is not intuitive how this process works
     #  (running a preprocessor and than pass its output to another
     #  function), but I have no better ideas at the moment
+    #  The AwardIdExtractor is built only the first time that some 
+    #  inputs are seen and reused as long as the same inputs are passed
+    if isinstance(inputs, AwardIdExtractor):
+        return inputs.extract(s, current_year, record, timer, normalized, 
+                              return_laws)
+    if _extractor is None or _extractor.inputs is not inputs:
+        _extractor = AwardIdExtractor(inputs)
+    return _extractor.extract(s, current_year, record, timer, normalized, 
+                              return_laws)
+
+def resources_fingerprint(inputs):
+    """Return a hash of the content of the 'inputs' produced by 
+    award_id_extractor_preprocessor() (i.e., of acronyms.txt, agencies.tsv, 
+    nih_institutes.tsv and zipcodes.tsv), so that any change to them 
+    can be detected
+    """
     acronyms, agencies, nih_institutes, zipcodes = inputs
+    hasher = hashlib.md5()
+    hasher.update(repr(list(acronyms)).encode())
+    for table, columns in [(agencies, ['ACNM','TITLE']),
+                           (nih_institutes, ['ACNM','TITLE']),
+                           (zipcodes, ['City','Zipcode'])]:
+        for column in columns:
+            hasher.update(repr(_column(table, column)).encode())
+    return hasher.hexdigest()
+
+class AwardIdCache:
+    """On-disk (SQLite) cache of the results of award_id_extractor()
     
-    # This is a patch, since I forgot to add the nih_institutes to the 
-    #  acronyms list. It must be definitively fixed in the 
-    #  award_id_extractor_preprocessor function
-    acronyms = acronyms + nih_institutes.ACNM.tolist()
-    
-    if current_year is None or np.isnan(current_year):
-        import datetime
-        now = datetime.datetime.now()
-        current_year = now.year
-    
-#     punctuation = string.punctuation
-#     punctuation = punctuation.replace('-','')
-#     punctuation = punctuation.replace('&','')
-#     punctuation = punctuation.replace('#','')
-#     punctuation = punctuation.replace('/','') #QUESTA DECISIONE E' VERAMENTE MOLTO DIFFICILE
-#     punctuation = punctuation.replace('.','')
-#     punctuation = punctuation.replace(',','')
-#     punctuation = punctuation.replace(';','')
-#     punctuation = punctuation.replace(':','')
-#     #punctuation = punctuation.replace('(','')
+    The results are stored by a hash of the statement (with the blank 
+     spaces collapsed, as award_id_extractor() does anyway) and of the year. 
+    The cache is bound to the resources_fingerprint() of the 'inputs' 
+     (and to the 'version' of the extractor and of the TextNormalizer): 
+     when they change, all the results stored are deleted
+    """
     
-    stops = '.,;:' #(&/ #QUESTA DECISIONE E' VERAMENTE MOLTO DIFFICILE
+    # Increase it when a change to the extractor changes its results
+    #  (or the columns of the table)
+    version = '2'
     
-    # Add a space near the punctuation when it is missing
-    s = re.sub('(;)([A-Za-z0-9])',lambda x: ' '.join(x.groups()),s)
-    s = re.sub('(:)([A-Za-z0-9])',lambda x: ' '.join(x.groups()),s)
-    s = re.sub('(\))([A-Za-z0-9])',lambda x: ' '.join(x.groups()),s)
-    s = re.sub('([A-Za-z0-9])(\()',lambda x: ' '.join(x.groups()),s)
-    #s = s.replace('(',' (')
-    #s = s.replace(')',') ')
-    
-    #tokenizer = RegexpTokenizer(r'[-,\w]+')
-    tokenizer = RegexpTokenizer(f'[-/&{stops}\w]+') #/ #QUESTA DECISIONE E' VERAMENTE MOLTO DIFFICILE valutare se tenere unite le parole separate da / o meno!
-#     for i in punctuation:
-#         gi_statement = gi_statement.replace(i,' ')
-#     gi_statement = re.sub('\s+', ' ', gi_statement)
-    
-    # Fix html char. codes 
-    s = htmlTOunicode(s)
-    # Remove consecutive hyphens
-    s = s.replace('--','-')
-    # Replace dashes with the hyphen # TODO Which other dashes exist? They are not included in string.puctuation and so they can create problems...
-    for c in ['–','—']:
-        s = s.replace(c,'-')
-    # Remove the double blank spaces
-    s = re.sub('\s+',' ',s)
-    
-    # Find the agency to help the matching
-    ags = findAgency(s, agencies, nih_institutes)
-    
-    # Remove the text related to the 'CROSS-REFERENCE TO RELATED APPLICATIONS' 
-    #  section that is, sometimes, erroneously reported after the government 
-    #  statement section. Moreover, also the patent numbers are removed
-    #s = re.split('(RELATED|PRIOR|OTHER) (PATENT\s)?APPLICATIONS?',s)[0]
-    s = re.sub('((Ser|Pat)(ent|\.)? (No\.?|[Aa]pplication)|S\.?N\.?) (\d{1,2}[/,])?\d{3}[/,]\s?\d{3}','',s)
-    s = re.sub('\d{2}/\d{3},\d{3}','',s)
-    s = re.sub('PCT[/\s]([A-Z]{2}|W0)\d{2,4}/\d{5,6}','',s)
-    # Remove the parts related to laws
-    s,pl = excludeLaws(s)
-    # Remove the zip codes of the US cities
-    s = removeZip(s, zipcodes)
-    # Remove post office box number
-    s = re.sub('P.O. Box \d+','',s)
-    
-    # Remove dates from the text (like Dec. 16, 2019)
-    s = removeDates(s)
-    # Remove title of the project
-    s = removeTitle(s)
-    # Remove name of files like xxx.txt
-    if s.find('.txt')!=-1:
-        s = removeFile(s, stops=stops)
-    
-    # Remove some words from few specific cases that are particularly 
-    #  complicated. This portion of code comes mostly from the USPTO script 
-    #  that you can find here: 
-    #  https://github.com/CSSIP-AIR/government-interest-parsing/
-    #   blob/master/NER.py
-    
-    len_check = len(s)
-    s = re.sub(('Licensing (and technical )?inquiri?es may be directed to'
-                ' .+\.(mil|gov)\.?'),'',s)
-    if (s.find('Legal Counsel')!=-1 or
-         s.find('Space and Naval Warfare Systems')!=-1):
-        if s.find('Calif')!=-1:
-            del_pattern = ('[Cc]ode \d{4,5}|'
-                           'D0012|53510|53560|'
-                           '(619)?\)?[-\s]?553-\d{4}|'
-                           '[\w.]+@[\w.]*navy\.mil|'
-                           '(([Rr]eferenc(e|ing)\s)|'
-                           '([Nn]avy [Cc]ase\s)|'
-                           '(NC\s))+(Number|No\.?)?\s?[\d\,\.]{5,7}')
-            s = re.sub(del_pattern,'',s)
-        elif  s.find('S.C.')!=-1:
-            del_pattern = ('[Cc]ode [A-Z0-9\-]+|'
-                           '29419(-9022)?|'
-                           '(843)?\)?[-\s]?218-\d{4}|'
-                           '[\w.]+@[\w.]*navy\.mil|'
-                           '(([Rr]eferenc(e|ing)\s)|'
-                           '([Nn]avy [Cc]ase\s)|'
-                           '(NC\s))+(Number|No\.?)?\s?[\d\,\.]{5,7}')
-            s = re.sub(del_pattern,'',s)
-    if len_check > len(s):
-        s = re.sub(('(([Rr]eferenc(e|ing)\s)|([Nn]avy [Cc]ase\s)|'
-                    '(NC\s))+(Number|No\.?)?\s?[\d\,\.]{5,7}'),'',s)
-    
-    if s.find('Environmental Protection Agency')!=-1:
-        s = s.replace('1025 F St','')
-    s = s.replace(('(COOPERATIVE RESEARCH AND TECHNOLOGY ENHANCEMENT '
-                   'ACT OF 2004 (CREATE ACT) (PUB. L. 108-453, 118 STAT.'
-                   ' 3596 (2004))'),'')
-    s = s.replace('CIRID at UCLA','')
-    
-    # Replace Eng or eng with ENG (it appears in some award ids)
-    s = re.sub('-[Ee]ng\.?-?','-ENG-',s)
-    
-    # Remove all the words with only upper cases at the beginning of the sentence
-    #  (in most, if not all, of the cases they are titles)
-    s = re.sub(r'^(0?[1-9][\s\.]{1,3})?\b[A-Z&\s-]+\b', '', s)
-    # Remove the punctuation
-#     s = s.translate(str.maketrans('','',punctuation))
-    s = removePunctuation(s, f'-&#/{stops}')
-    # Transforme & in "and" if there are spaces on both sizes
-    #  and than transform & in a comma and a space if it is not surrounded by 
-    #  uppercases only (as in acronymes)
-    s = s.replace(' & ',' and ')
-    s = re.sub(f'(?![\s\(][A-Z]+)&(?![A-Z]+[\s\){stops}])',', ',s)
-    # Replace AAA/BBB with AAA-BBB and than 
-    #  replace / with a comma and a blank space
-    ##s = re.sub('(^[A-Z]+)/([A-Z]+$)',lambda w: w.group(1) + '-' + w.group(2),s)
-    s = re.sub(r'(\b[A-Z]+)/([A-Z]+\b)',lambda w: w.group(1) + ' ' + w.group(2),s)
-    ###s = s.replace('/',', ')
-    # Replace # with a blank space
-    s = s.replace('#',' ')
-    # Replace "AA1111, 2222 and 3333" with "AA+1111, AA+2222 and AA+3333"
-    s = award_ids_modifier(s)
-    # Tokenise
-    tokens = tokenizer.tokenize(s)
-    # Remove words with only letters and, eventually, a dash
-    # (we are looking for things with numbers and, eventually, capital letters)
-    # s = [re.sub('^[A-Z]?[a-z]*[-]?[A-Z]?[a-z]$','',w) for w in tokens]
-    s = re.sub(r'\b[A-Z]?[a-z]+(-[A-Z]?[a-z]+)?\b','',s)
-    s = tokenizer.tokenize(s)
-    # Remove the word 'U.S.'
-    s = list(filter(('U.S.').__ne__, s))
-    # Remove words with only one letter that is not a number
-    s = [w for w in s if ((len(w)>2 and w[-1:] in stops) or 
-                          len(w)>1 or 
-                          w.isnumeric())]
-    # Remove the words that are contained in the acronyms list
-    s = [w for w in s if not isAcronym(w, acronyms)]
-    # Preserve only words (one among these cases)
-    #  - that are shorter than 3 characters with only uppercases
-    #  - that contain at least one number
-    #  - whose basic form (see above) is not in the English dictionary
-    s = [w for w in s if includeWord(w)]
-    # Look at the word immediately before or after the one identified as 
-    #  potential award ids and, if it's not an acronym, add it to the potential
-    #  award ids with a '+' in between (look at the addIsolated function 
-    #  for further details)
-    s_add = []
-    idxs = []
-    for ws in set(s):
-        idxs.extend(idx for idx, elm in enumerate(tokens) if elm==ws)
-    for idx in idxs:
-        w = addIsolated(tokens, idx, s, 
-                        acronyms, stops=stops, forward=False)
-        if isinstance(w, list):
-            for w_ in w:
-                s_add.append(w_)
+    def __init__(self, path, inputs):
+        import sqlite3
+        
+        self.path = path
+        self.fingerprint = f'{self.version}-{TextNormalizer.version}-' \
+                           f'{resources_fingerprint(inputs)}'
+        self._spaces = re.compile('\s+')
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS meta '
+                '(name TEXT PRIMARY KEY, value TEXT)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS award_ids '
+                '(key TEXT PRIMARY KEY, award_id TEXT, '
+                'public_law_statement INTEGER, '
+                'awarding_agency_acronymes TEXT, potential_year INTEGER, '
+                'public_laws TEXT)')
+            fingerprint = self._connection.execute(
+                "SELECT value FROM meta WHERE name='fingerprint'").fetchone()
+            if fingerprint is None or fingerprint[0]!=self.fingerprint:
+                # The table is created again, since its columns 
+                #  may have changed as well
+                self._connection.execute('DROP TABLE award_ids')
+                self._connection.execute(
+                    'CREATE TABLE award_ids '
+                    '(key TEXT PRIMARY KEY, award_id TEXT, '
+                    'public_law_statement INTEGER, '
+                    'awarding_agency_acronymes TEXT, potential_year INTEGER, '
+                    'public_laws TEXT)')
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)",
+                    (self.fingerprint,))
+    
+    def key(self, s, current_year=None):
+        if current_year is None or current_year!=current_year: # i.e., NaN
+            current_year = datetime.datetime.now().year
+        s = self._spaces.sub(' ', s)
+        return hashlib.sha1(f'{int(current_year)}\n{s}'.encode()).hexdigest()
+    
+    def get(self, keys):
+        """Return a dictionary with the AwardIdRecord of the keys found"""
+        found = {}
+        keys = list(set(keys))
+        # SQLite doesn't accept more than 999 parameters per query
+        for i in range(0, len(keys), 900):
+            keys_ = keys[i:i+900]
+            rows = self._connection.execute(
+                'SELECT * FROM award_ids WHERE key IN '
+                f"({','.join('?'*len(keys_))})", keys_)
+            for key, award_id, pl, ags, iy, laws in rows:
+                found[key] = AwardIdRecord(award_id, bool(pl), ags, bool(iy), 
+                                           laws)
+        return found
+    
+    def put(self, records):
+        """Store the AwardIdRecord of a dictionary by key"""
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO award_ids VALUES (?, ?, ?, ?, ?, ?)',
+                [(key, award_id, int(pl), ags, int(iy), laws) 
+                 for key, (award_id, pl, ags, iy, laws) in records.items()])
+    
+    def __len__(self):
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM award_ids').fetchone()[0]
+    
+    def close(self):
+        self._connection.close()
+
+_worker_extractor = None
+
+def _init_worker(inputs):
+    # Each worker builds its own AwardIdExtractor only once, 
+    #  when the pool starts, and reuses it for all the chunks it receives
+    global _worker_extractor
+    if _worker_extractor is None or _worker_extractor.inputs is not inputs:
+        _worker_extractor = AwardIdExtractor(inputs)
+
+def _extract_chunk(chunk):
+    # Each chunk gets its own StageTimer (if required), that is returned 
+    #  with the results to be merged with the one of the main process
+    statements, years, timed = chunk
+    timer = StageTimer() if timed else None
+    results = AwardIdAccumulator()
+    for s, y in zip(statements, years):
+        results.append(_worker_extractor.extract(s, y, record=True, 
+                                                 timer=timer, 
+                                                 normalized=True))
+    return results, timer
+
+def award_id_extractor_stream(dfs, inputs, text_col='gi_statement', 
+                              year_col=None, n_cores=os.cpu_count()-1,
+                              chunksize=1000, cache=None, timer=None, 
+                              return_laws=False):
+    """Run award_id_extractor() over an iterable of dataframes
+    (e.g., the chunks returned by pd.read_csv(..., chunksize=...))
+    
+    The dataframes are consumed one at a time, and a dataframe with 
+     the results is yielded for each of them (see award_id_extractor_df), 
+     so that only one of them has to be kept in memory.
+    The 'inputs' are the output of award_id_extractor_preprocessor(). 
+    The same pool of 'n_cores' processes is used for all the dataframes.
+    If a 'cache' is provided (an AwardIdCache or the path of its file), 
+     the results already stored there are not computed again, and 
+     the new ones are added to it. 
+    If a StageTimer is provided as 'timer', the time spent in each stage 
+     of the extraction (by all the processes) is added to it. 
+    With return_laws=True, the results have also a 'public_laws' column 
+     (see AwardIdRecord)
+    """
+    if cache is not None and not isinstance(cache, AwardIdCache):
+        cache = AwardIdCache(cache, inputs)
+    
+    def extract(statements, years, mapper):
+        chunks = [(statements[i:i+chunksize], years[i:i+chunksize], 
+                   timer is not None)
+                  for i in range(0, len(statements), chunksize)]
+        award_ids = AwardIdAccumulator()
+        for chunk_results, chunk_timer in mapper(_extract_chunk, chunks):
+            award_ids.extend(chunk_results)
+            if chunk_timer is not None:
+                timer.merge(chunk_timer)
+        return award_ids
+    
+    def process(df, mapper):
+        # The statements are normalized at once (see normalizeTextSeries), 
+        #  but the cache keys are computed from the original ones
+        start = time.perf_counter()
+        normalized = normalizeTextSeries(df[text_col]).tolist()
+        if timer is not None:
+            timer.add('normalization', time.perf_counter()-start, len(df))
+        statements = df[text_col].tolist()
+        if year_col is None:
+            years = [None]*len(statements)
         else:
-            #s = [w]
-            s_add.append(w)
-    for idx in idxs:
-        w = addIsolated(tokens, idx, s,
-                        acronyms, stops=stops, forward=True)
-        if isinstance(w, list):
-            for w_ in w:
-                s_add.append(w_)
+            years = df[year_col].astype(float).tolist()
+        
+        if cache is None:
+            award_ids = extract(normalized, years, mapper)
         else:
-            #s = [w]
-            s_add.append(w)
-#     s = set(s_add.copy())
-    s = set(s + s_add.copy())
-    s = [w.translate(str.maketrans('','',stops)) for w in s]
-    # Remove any potential award id shorter than 4 char. and 
-    #  that doesn't contain numbers
-    s = [w for w in s if (len(removePunctuation(w))>4 and 
-                          any(c.isdigit() for c in w))]
-    # Add a "flag", if any of the potential award ids is a potential year 
-    #  (i.e., essentially a 19 or 20 followed by other 2 digits; 
-    #  for further details look at the isYear function) 
-    iy = any([isYear(w, current_year) for w in s])
-    # Remove the award ids contained in other (longer) award ids
-    s.sort(key=len)
-    for i,w in enumerate(s[:]):
-        if any(w in o for o in s[i+1:]):
-            s.remove(w)
-    # Join the potential award ids detected in a string separated by "|"
-    if len(s)==0:
-        s = ['']
+            keys = [cache.key(s, y) for s, y in zip(statements, years)]
+            found = cache.get(keys)
+            # The same statement is extracted only once
+            missing = {}
+            for key, s, y in zip(keys, normalized, years):
+                if key not in found and key not in missing:
+                    missing[key] = (s, y)
+            if len(missing)>0:
+                statements_, years_ = zip(*missing.values())
+                records = dict(zip(missing, extract(list(statements_), 
+                                                    list(years_), mapper)))
+                cache.put(records)
+                found.update(records)
+            award_ids = AwardIdAccumulator()
+            for key in keys:
+                award_ids.append(found[key])
+        
+        award_ids = award_ids.to_frame(index=df.index, 
+                                       return_laws=return_laws)
+        award_ids.loc[award_ids.award_id=='','award_id'] = np.nan
+        return award_ids
+    
+    if n_cores<=1:
+        _init_worker(inputs)
+        for df in dfs:
+            yield process(df, map)
     else:
-        s = removeShorter(s)
-    s = '|'.join(s)
-    
-    return pd.Series({
-        'award_id': s,
-        'public_law_statement': pl,
-        'awarding_agency_acronymes': ags,
-        'potential_year':iy})
-
-# import multiprocessing as mp
-# def award_id_extractor_df(df, n_cores = mp.cpu_count()-1):
-#     import numpy as np
-#     import pandas as pd
-#     from tqdm import tqdm
-    
-#     ipts = award_id_extractor_preprocessor(df, n_cores)
-    
-#     tqdm.pandas()
-#     if n_cores==1:
-#         # TODO
-#         # This function works only with these specific column names. 
-#         #  It has to be generalized!
-#         if 'grant_year' in df.columns:
-#             award_ids = df.progress_apply(lambda row: award_id_extractor(
-#                 row.gi_statement,
-#                 ipts, 
-#                 row.grant_year), 
-#                 axis=1, result_type='reduce')
-#         else:
-#             award_ids = df.progress_apply(lambda row: award_id_extractor(
-#                 row.gi_statement,
-#                 ipts),
-#                 axis=1, result_type='reduce')
-#         award_ids = pd.DataFrame(award_ids.tolist())
-#         ###patent_id = df.patent_id
-#         #df_out = df.copy()
-#         ##df_out['award_id'] = award_ids
-#         ###df_out = pd.DataFrame(df_out)
-#         #df_out = pd.concat([df_out,award_ids], axis=1)
-#         #df_out.loc[df_out.award_id=='','award_id'] = np.nan
-#         #df_out.reset_index(inplace=True, drop=True)
-#         #return df_out
-#         award_ids.loc[award_ids.award_id=='','award_id'] = np.nan
-#         return award_ids
-#     else:
-#         import multiprocessing as mp
-#         from pathos.multiprocessing import ProcessingPool as Pool
-#         from functools import partial
-#         #from multiprocessing import Pool#, freeze_support
-#         #from itertools import repeat
-#         import sys
-        
-#         # The dataframe is too long and exceded the recursion limits
-#         #  This fixes the issue
-#         try:
-#             sys.setrecursionlimit(round(len(df)/n_cores)*2)
-#         except:
-#             pass
-        
-#         df_split = np.array_split(df, n_cores)
-#         with Pool(n_cores) as pool:
-#             #df_out = pool.map(award_id_extractor_df, df_split, 1)
-#             df_out = pool.map(partial(award_id_extractor_df, n_cores=1), df_split)
-#         df_out = pd.concat(df_out, ignore_index=True)
-#         return df_out
+        with mp.Pool(n_cores, initializer=_init_worker,
+                     initargs=(inputs,)) as pool:
+            for df in dfs:
+                # imap returns the chunks in the same order they are submitted
+                yield process(df, pool.imap)
 
-def explode_award_ids(df, lst_cols, sep='|', fill_value='', preserve_index=False):
-    import numpy as np
-    import pandas as pd
+def award_id_extractor_df(df, text_col='gi_statement', year_col=None,
+                          inputs=None, n_cores=os.cpu_count()-1,
+                          chunksize=1000, cache=None, timer=None, 
+                          return_laws=False):
+    """Run award_id_extractor() over all the statements in df[text_col]
+    
+    The year of each statement is taken from df[year_col], if provided.
+    The 'inputs' are the output of award_id_extractor_preprocessor() 
+     (that is called here, if they are not provided). 
+    The statements are split in chunks of 'chunksize' rows that are 
+     processed by a pool of 'n_cores' processes. 
+    An AwardIdCache (or the path of its file) can be passed as 'cache' 
+     (see award_id_extractor_stream), and a StageTimer as 'timer'. 
+    With return_laws=True, the results have also a 'public_laws' column. 
+    It returns a dataframe with the same index as df, 
+     and the results in the same order of the statements
+    """
+    if inputs is None:
+        # The preprocessor looks for the cities in df.gi_statement
+        inputs = award_id_extractor_preprocessor(
+            df[[text_col]].rename(columns={text_col:'gi_statement'}), 
+            n_cores)
+    
+    return next(award_id_extractor_stream([df], inputs, text_col, year_col,
+                                          n_cores, chunksize, cache, 
+                                          timer, return_laws))
+
+def _readTable(file_name, chunksize, usecols=None):
+    # The compression (e.g., gzip) is inferred from the file extension
+    sep = '\t' if '.tsv' in file_name else ','
+    return pd.read_csv(file_name, sep=sep, chunksize=chunksize, 
+                       usecols=usecols)
+
+def _shardName(output, shard, n_output):
+    
+    if os.path.isdir(output):
+        output = os.path.join(output, 'award_ids.tsv')
+    if n_output==1:
+        return output
+    directory, file_name = os.path.split(output)
+    name, ext = file_name.split('.', 1) if '.' in file_name else (file_name, '')
+    ext = f'.{ext}' if ext else ''
+    return os.path.join(directory, f'{name}_{shard}{ext}')
+
+def main():
+    """Extract the award ids from the statements in the input file(s)
+    
+    The input files (TSV or CSV, possibly compressed) are read in chunks 
+     of --chunksize rows, that are written, as soon as they are processed, 
+     in turn to the --n_output output files. So, the memory needed 
+     doesn't depend on the size of the input
+    """
+    from itertools import tee
+    try:
+        from .parse_args import io_parser
+    except ImportError:
+        from parse_args import io_parser
+    
+    parser = io_parser('Award IDs Extractor')
+    parser.add_argument(
+        '--text_col', 
+        help = 'column with the statements (default: gi_statement)', 
+        default = 'gi_statement', 
+        required = False
+    )
+    parser.add_argument(
+        '--year_col', 
+        help = 'column with the year of the statements (optional)', 
+        default = None, 
+        required = False
+    )
+    parser.add_argument(
+        '--chunksize', 
+        help = 'number of rows read at a time (default: 10000)', 
+        default = 10000, 
+        type = int, 
+        required = False
+    )
+    parser.add_argument(
+        '--n_cores', 
+        help = 'number of processes (default: number of CPUs - 1)', 
+        default = os.cpu_count()-1, 
+        type = int, 
+        required = False
+    )
+    parser.add_argument(
+        '--cache', 
+        help = 'SQLite file where the results are cached (optional)', 
+        default = None, 
+        required = False
+    )
+    parser.add_argument(
+        '--profile', 
+        help = 'JSON file where the time spent in each stage ' \
+               'of the extraction is reported (optional)', 
+        default = None, 
+        required = False
+    )
+    parser.add_argument(
+        '--laws', 
+        help = 'add a public_laws column with the families of ' \
+               'the laws found in each statement', 
+        action = 'store_true'
+    )
+    args = parser.parse_args()
+    if (args.input is None and args.input_list is None) or args.output is None:
+        parser.error('an input (-i or -I) and an output (-o) are required')
     
+    input_files = args.input_list or [args.input]
+    
+    df = None
+    if not os.path.isfile(f'{folder}/zipcodes.tsv'):
+        # Only to create zipcodes.tsv, all the statements are needed once
+        df = pd.concat([chunk for input_file in input_files 
+                        for chunk in _readTable(input_file, args.chunksize, 
+                                                [args.text_col])])
+        df = df.rename(columns={args.text_col:'gi_statement'})
+    inputs = award_id_extractor_preprocessor(df, max(args.n_cores, 1))
+    del df
+    
+    def chunks():
+        for input_file in input_files:
+            for chunk in _readTable(input_file, args.chunksize):
+                yield chunk
+    
+    # Each chunk is read once, and kept only until its results are written
+    chunks, chunks_ = tee(chunks())
+    timer = StageTimer() if args.profile is not None else None
+    results = award_id_extractor_stream(chunks_, inputs, 
+                                        args.text_col, args.year_col, 
+                                        args.n_cores, cache=args.cache, 
+                                        timer=timer, return_laws=args.laws)
+    for i, (chunk, award_ids) in enumerate(zip(chunks, results)):
+        chunk = pd.concat([chunk.drop(columns=args.text_col), award_ids], 
+                          axis=1)
+        shard = i % args.n_output
+        chunk.to_csv(_shardName(args.output, shard, args.n_output), 
+                     sep='\t', index=False, 
+                     mode='w' if i<args.n_output else 'a', 
+                     header=i<args.n_output)
+    
+    if timer is not None:
+        timer.to_json(args.profile)
+
+def explode_award_ids(df, lst_cols, sep='|', fill_value='', preserve_index=False):
     # make sure `lst_cols` is list-alike
     if (lst_cols is not None
         and len(lst_cols) > 0
@@ -880,3 +2012,6 @@ def explode_award_ids(df, lst_cols, sep='|', fill_value='', preserve_index=False
         res = res.reset_index(drop=True)
     
     return res
+
+if __name__ == '__main__':
+    main()
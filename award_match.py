@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+
+"""
+Modules to link the award IDs found in the patents (see award_id.py)
+ to the award IDs of the scientific publications (see crossref.py).
+Part of the IRIS project.
+
+The award IDs are first canonicalized (see canonical_award_id), then one
+ side is indexed (in blocks of bounded size) with a hash index, for the
+ exact matches, and a character n-gram index, for the approximate ones,
+ and the other side is streamed against it.
+
+Author: Carlo Bottai
+Copyright (c) 2021 - TU/e and EPFL
+License: See the LICENSE file.
+Date: 2021-01-27
+
+"""
+
+import re
+from array import array
+from functools import lru_cache
+
+try:
+    from .lazy_import import LazyModule
+except ImportError:
+    from lazy_import import LazyModule
+
+# These are imported only the first time they are used
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+# Words that often precede the award IDs and that are not part of them
+#  (e.g., "NSF grant DMR-1234567" or "NIH+R01+GM123456")
+award_words = frozenset([
+    'AWARD', 'AWARDS', 'CONTRACT', 'CONTRACTS', 'GRANT', 'GRANTS',
+    'NO', 'NOS', 'NUMBER', 'NUMBERS'])
+
+# The acronyms of the main US funding agencies and NIH institutes
+#  (a different set can be passed to canonical_award_id, e.g.,
+#  the acronyms produced by award_id.award_id_extractor_preprocessor)
+agency_codes = frozenset([
+    'AFOSR', 'AFRL', 'AIR', 'ARMY', 'ARO', 'ARPA', 'DARPA', 'DHS', 'DOD',
+    'DOE', 'DOT', 'EPA', 'FORCE', 'HHS', 'NASA', 'NAVY', 'NCI', 'NHLBI',
+    'NIA', 'NIAID', 'NIDA', 'NIGMS', 'NIH', 'NIMH', 'NIST', 'NOAA', 'NSF',
+    'ONR', 'PHS', 'US', 'USA', 'USAF', 'USDA', 'USN'])
+
+_separators = re.compile(r'[\W_]+')
+
+def canonical_award_id(award_id, agency_codes=agency_codes):
+    """Return the canonical form of an award ID
+    
+    It is in uppercase, without separators (spaces, punctuation and the '+'
+     added by award_id.addIsolated and award_id.award_ids_modifier), and
+     without the agency codes and the words like "grant" or "no."
+     that precede it (e.g., "NIH+R01 GM-123456" becomes "R01GM123456").
+    None is returned if the award ID contains no digits,
+     since it could not be matched reliably
+    """
+    if not isinstance(award_id, str):
+        return None
+    award_id = award_id.upper().replace('U.S.', 'US')
+    tokens = [token for token in _separators.split(award_id) if token]
+    i = 0
+    # The last token is always preserved
+    while (i<len(tokens)-1 and
+           (tokens[i] in agency_codes or tokens[i] in award_words)):
+        i += 1
+    award_id = ''.join(tokens[i:])
+    if not any(c.isdigit() for c in award_id):
+        return None
+    return award_id
+
+def ngrams(s, n=3):
+    return {s[i:i+n] for i in range(len(s)-n+1)}
+
+class AwardIdIndex:
+    """Hash index and character n-gram index over a set of award IDs
+    
+    Each distinct canonical award ID is stored once, with the list of
+     the (key, award ID) pairs it comes from (e.g., the DOIs of the
+     publications that report it), and its n-grams are added to the
+     n-gram index (the positions of the award IDs are stored in arrays).
+    The n-grams shared by more than 'max_postings' award IDs (e.g., '000')
+     are not used to find the candidates of an approximate match,
+     so that each search only visits short lists
+    """
+    
+    def __init__(self, n=3, max_postings=10000):
+        self.n = n
+        self.max_postings = max_postings
+        self.canonical = []
+        self.keys = []
+        self._positions = {}
+        self._sizes = array('i')
+        self._postings = {}
+    
+    def __len__(self):
+        return len(self.canonical)
+    
+    def add(self, key, award_id, canonical):
+        position = self._positions.get(canonical)
+        if position is None:
+            position = len(self.canonical)
+            self._positions[canonical] = position
+            self.canonical.append(canonical)
+            self.keys.append([])
+            grams = ngrams(canonical, self.n)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                postings = self._postings.get(gram)
+                if postings is None:
+                    postings = self._postings[gram] = array('i')
+                postings.append(position)
+        self.keys[position].append((key, award_id))
+    
+    def exact(self, canonical):
+        """Return the position of 'canonical' in the index (or None)"""
+        return self._positions.get(canonical)
+    
+    def approximate(self, canonical, min_score=.8):
+        """Return a list of (position, score) with the award IDs whose
+        n-grams are similar to the ones of 'canonical'
+        (Dice coefficient of the two sets of n-grams >= min_score),
+        excluding 'canonical' itself
+        """
+        grams = ngrams(canonical, self.n)
+        size = len(grams)
+        postings = []
+        skipped = 0
+        for gram in grams:
+            postings_ = self._postings.get(gram)
+            if postings_ is None:
+                continue
+            if len(postings_)>self.max_postings:
+                skipped += 1
+                continue
+            postings.append(np.frombuffer(postings_, dtype=np.intc))
+        if len(postings)==0:
+            return []
+        
+        # The number of n-grams shared with each award ID is counted 
+        #  at once, and only the award IDs that can reach min_score 
+        #  are examined one by one. The n-grams skipped could be shared 
+        #  as well, so, if any, this is an upper bound of the score 
+        #  that is then checked exactly
+        positions, shared = np.unique(np.concatenate(postings), 
+                                      return_counts=True)
+        sizes = np.frombuffer(self._sizes, dtype=np.intc)[positions]
+        scores = 2*(shared+skipped)/(size+sizes)
+        selected = np.flatnonzero(scores>=min_score)
+        
+        candidates = []
+        for position, score, size_ in zip(positions[selected].tolist(), 
+                                          scores[selected].tolist(),
+                                          sizes[selected].tolist()):
+            canonical_ = self.canonical[position]
+            if canonical_==canonical:
+                continue
+            if skipped>0:
+                shared_ = len(grams & ngrams(canonical_, self.n))
+                score = 2*shared_/(size+size_)
+                if score<min_score:
+                    continue
+            candidates.append((position, score))
+        return candidates
+
+def _pairs(pairs):
+    # A function (that returns an iterator) can be passed in place of
+    #  an iterable, so that it can be read more than once
+    return pairs() if callable(pairs) else iter(pairs)
+
+def match_award_ids(left, right, min_score=.8, approximate=True, n=3,
+                    max_postings=10000, index_size=1000000, min_length=5,
+                    agency_codes=agency_codes):
+    """Link the award IDs of 'left' to the ones of 'right'
+    
+    'left' and 'right' are iterables of (key, award ID) pairs
+     (e.g., (patent ID, award ID) and (DOI, award ID)).
+    It yields (left key, left award ID, right key, right award ID, score)
+     tuples, with score 1 for the award IDs that are identical after
+     canonicalization and, if 'approximate', the Dice coefficient of
+     the character n-grams of the others (if >= min_score).
+    The canonical award IDs shorter than 'min_length' are ignored.
+    'right' is read once and indexed in blocks of 'index_size' distinct
+     award IDs; 'left' is read once for each block, so if 'right' is
+     larger than that, 'left' must be a sequence (or a function that
+     returns a new iterator each time it is called).
+     In this way, the memory needed doesn't depend on the number of
+     award IDs to be matched
+    """
+    canonical = lru_cache(maxsize=100000)(
+        lambda award_id: canonical_award_id(award_id, agency_codes))
+    
+    def blocks():
+        index = AwardIdIndex(n, max_postings)
+        for key, award_id in _pairs(right):
+            canonical_ = canonical(award_id)
+            if canonical_ is None or len(canonical_)<min_length:
+                continue
+            index.add(key, award_id, canonical_)
+            if len(index)>=index_size:
+                yield index
+                index = AwardIdIndex(n, max_postings)
+        if len(index)>0:
+            yield index
+    
+    for i, index in enumerate(blocks()):
+        left_pairs = _pairs(left)
+        if i>0 and left_pairs is left:
+            raise ValueError('left is an iterator and can be read only once, '
+                             'but right does not fit in one block: pass '
+                             'a sequence or a function instead')
+        for key, award_id in left_pairs:
+            canonical_ = canonical(award_id)
+            if canonical_ is None or len(canonical_)<min_length:
+                continue
+            position = index.exact(canonical_)
+            if position is not None:
+                for key_, award_id_ in index.keys[position]:
+                    yield key, award_id, key_, award_id_, 1.
+            if approximate:
+                for position, score in index.approximate(canonical_,
+                                                         min_score):
+                    for key_, award_id_ in index.keys[position]:
+                        yield key, award_id, key_, award_id_, score
+
+def match_award_ids_df(left, right, left_key, right_key,
+                       award_col='award_id', sep='|', **kwargs):
+    """Link the award IDs in left[award_col] to the ones in right[award_col]
+    
+    Multiple award IDs in the same cell must be separated by 'sep'
+     (as in the output of award_id.award_id_extractor).
+    The smaller dataframe is indexed, and the other one is streamed 
+     against it. The other arguments are passed to match_award_ids.
+    It returns a dataframe with the columns left_key, 'left_award_id',
+     right_key, 'right_award_id' and 'score'
+    """
+    def pairs(df, key):
+        def iterate():
+            for k, award_ids in zip(df[key], df[award_col]):
+                if isinstance(award_ids, str):
+                    for award_id in award_ids.split(sep):
+                        if award_id:
+                            yield k, award_id
+        return iterate
+    
+    if left_key==right_key:
+        columns = [f'left_{left_key}', f'right_{right_key}']
+    else:
+        columns = [left_key, right_key]
+    columns = [columns[0], 'left_award_id', columns[1], 'right_award_id',
+               'score']
+    if len(left)>=len(right):
+        matches = match_award_ids(pairs(left, left_key), 
+                                  pairs(right, right_key), **kwargs)
+    else:
+        matches = match_award_ids(pairs(right, right_key), 
+                                  pairs(left, left_key), **kwargs)
+        matches = ((key, award_id, key_, award_id_, score) 
+                   for key_, award_id_, key, award_id, score in matches)
+    return pd.DataFrame(list(matches), columns=columns)
@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of the award_id pipeline on a synthetic corpus of
+ government-interest statements.
+ award_id_extractor is timed end to end, and findAgency, removeZip,
+ removeDates, excludeLaws, addIsolated and removeShorter separately,
+ at several corpus sizes. excludeLaws is timed also against its
+ original implementation (all the patterns applied, in turn, to each
+ statement), after checking that the two give the same output.
+Part of the IRIS project.
+
+The corpus is generated deterministically (given the seed) and covers
+ agencies, NIH institutes, zip codes, dates, law citations, references
+ to .txt files and lists of award ids like "AA1234, 5678 and 9012".
+ The agencies, NIH institutes and zip codes used are synthetic as well,
+ so only the NLTK corpora used by award_id are needed.
+
+Usage: python benchmarks/award_id_pipeline.py [-s SIZES] [-r REPEAT]
+        [--seed SEED] [--json OUTPUT] [--baseline BASELINE]
+ With --json, the results are also saved in a JSON file that can be
+ passed as --baseline to a later run (e.g., of another version of the
+ code) to print the change of each measure.
+
+Author: Carlo Bottai
+Copyright (c) 2020 - TU/e and EPFL
+License: See the LICENSE file.
+Date: 2021-01-25
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, root)
+from award_id import (AgencyTable, ZipcodeTable, AwardIdExtractor,
+                      award_id_extractor, findAgency, removeZip,
+                      removeDates, excludeLaws, addIsolated,
+                      removeShorter)
+
+agencies = [
+    ('NIH', 'National Institutes of Health'),
+    ('NSF', 'National Science Foundation'),
+    ('DOE', 'Department of Energy'),
+    ('DOD', 'Department of Defense'),
+    ('NASA', 'National Aeronautics and Space Administration'),
+    ('DARPA', 'Defense Advanced Research Projects Agency'),
+    ('ONR', 'Office of Naval Research'),
+    ('ARO', 'Army Research Office'),
+    ('AFOSR', 'Air Force Office of Scientific Research'),
+    ('USDA', 'Department of Agriculture'),
+    ('EPA', 'Environmental Protection Agency'),
+    ('NIST', 'National Institute of Standards and Technology'),
+    ('DHS', 'Department of Homeland Security'),
+    ('HHS', 'Department of Health and Human Services')]
+
+nih_institutes = [
+    ('NCI', 'National Cancer Institute'),
+    ('NHLBI', 'National Heart, Lung, and Blood Institute'),
+    ('NIA', 'National Institute on Aging'),
+    ('NIAID', 'National Institute of Allergy and Infectious Diseases'),
+    ('NIGMS', 'National Institute of General Medical Sciences'),
+    ('NIMH', 'National Institute of Mental Health')]
+
+zipcodes = [
+    ('Bethesda', '20810|20811|20813|20814|20014'),
+    ('Huntsville', '35801|35802|35803|35805|35806'),
+    ('Arlington', '22201|22202|22203|22204'),
+    ('Pasadena', '91101|91102|91103'),
+    ('San Diego', '92101|92102|92103|92152'),
+    ('Albuquerque', '87101|87102|87185'),
+    ('Oak Ridge', '37830|37831')]
+
+templates = [
+    # Agency (title) and a single award id
+    ('This invention was made with government support under {award} '
+     'awarded by the {agency}. The government has certain rights '
+     'in the invention.'),
+    # Agency (acronym)
+    ('This invention was made with Government support under Contract '
+     'No. {award} awarded by the {acronym}. The Government has certain '
+     'rights in this invention.'),
+    # NIH institute and two award ids
+    ('This invention was made with government support under grant '
+     'numbers {award} and {award2} from the {institute}. The government '
+     'has certain rights in the invention.'),
+    # List of award ids sharing the same prefix
+    ('STATEMENT OF GOVERNMENT INTEREST This work was supported by the '
+     '{acronym} under grants {prefix}{n4}, {others}. '
+     'The United States government has rights in this invention.'),
+    # Law citations
+    ('The invention described herein was made in the performance of work '
+     'under a NASA contract and is subject to the provisions of Section '
+     '305 of the National Aeronautics and Space Act of 1958, Public Law '
+     '85-568 (72 Stat. 435; 42 U.S.C. 2457). See also 35 U.S.C. 202 '
+     'and 48 CFR 52.227-11.'),
+    # Zip code and dates
+    ('The United States Government has rights in this invention pursuant '
+     'to Contract No. {award} between the {agency} and the University, '
+     '{city}, {zipcode}-{n4}. Awarded on {month} {day}, {year} and '
+     'amended on {mm}/{day}/{yy}.'),
+    # Reference to a .txt file
+    ('This invention was made with government support under {award} '
+     'awarded by the {acronym}. The sequence listing in the file '
+     'SEQ_LIST_{n4}.txt, created on {month} {day}, {year}, is '
+     'incorporated by reference.'),
+    # Mixed content
+    ('Funded by the {acronym} &amp; the {institute} under {award} '
+     '&mdash; P.O. Box {n4}, {city} {zipcode}. Ser. No. 12/{n3},{n3} '
+     'and PCT/US{year}/0{n4}.')]
+
+awards = ['DE-AC05-00OR{n5}', 'CHE-{n7}', 'R01 GM{n6}', 'FA9550-{n2}-1-{n4}',
+          'N00014-{n2}-1-{n4}', 'W81XWH-{n2}-2-{n4}', 'NNX{n2}AB{n2}A',
+          'DMR {n7}', '1R43HL{n6}-01', 'EEC-{n7}', 'grant {n5}']
+
+months = ['January','February','March','April','May','June','July',
+          'August','September','October','November','December',
+          'Jan.','Feb.','Mar.','Apr.','Aug.','Sept.','Oct.','Nov.','Dec.']
+
+def synthetic_inputs():
+    """Return the same four variables that award_id_extractor_preprocessor()
+    would produce, built from the synthetic agencies, NIH institutes
+    and zip codes
+    """
+    acronyms = [acnm for acnm,_ in agencies] + \
+        ['ARPA', 'SBIR', 'STTR', 'ARMY', 'NAVY']
+    agencies_ = AgencyTable(*map(tuple, zip(*agencies)))
+    nih_institutes_ = AgencyTable(*map(tuple, zip(*nih_institutes)))
+    zipcodes_ = ZipcodeTable(*map(tuple, zip(*zipcodes)))
+    return acronyms, agencies_, nih_institutes_, zipcodes_
+
+def synthetic_statements(n, seed=0):
+    """Return a list of n (statement, year) tuples
+
+    Each statement is made of one to three of the templates above
+     (with random award ids, agencies, cities, dates, ...)
+    """
+    rnd = random.Random(seed)
+
+    def number(k):
+        return ''.join(rnd.choice('0123456789') for _ in range(k))
+
+    def fill(template):
+        city, zc = rnd.choice(zipcodes)
+        fields = {f'n{k}':number(k) for k in range(2,8)}
+        fields.update(
+            agency = rnd.choice(agencies)[1],
+            acronym = rnd.choice(agencies)[0],
+            institute = rnd.choice(nih_institutes)[1],
+            prefix = rnd.choice(['AA', 'CA', 'GM', 'HL']),
+            city = city,
+            zipcode = rnd.choice(zc.split('|')),
+            month = rnd.choice(months),
+            day = rnd.randint(1,28),
+            mm = rnd.randint(1,12),
+            year = rnd.randint(1980,2020),
+            yy = number(2))
+        others = [number(4) for _ in range(rnd.randint(1,4))]
+        fields['others'] = ' and '.join([', '.join(others[:-1]), others[-1]]) \
+            if len(others)>1 else others[0]
+        fields['award'] = rnd.choice(awards).format(**fields)
+        fields['award2'] = rnd.choice(awards).format(**fields)
+        return template.format(**fields)
+
+    statements = []
+    for _ in range(n):
+        s = ' '.join(fill(rnd.choice(templates))
+                     for _ in range(rnd.randint(1,3)))
+        year = rnd.choice([None, 1995, 2005, 2019])
+        statements.append((s, year))
+    return statements
+
+def baselineExcludeLaws(gi_statement):
+    """The original implementation of excludeLaws (before LawRemover),
+    used as a reference for its output and speed
+    """
+    len_check = len(gi_statement)
+
+    if len(re.findall('S\.?B\.?I\.?R\.?',gi_statement))>0:
+        sbir_statement = '106-554, Small Business Reauthorization Act of 2000'
+        gi_statement = re.sub(sbir_statement,'',gi_statement)
+
+    nasa_statement = ('([Ss]ection\s)?(305|20135\(b\)) of the (National '
+                      'Aeronautic(s)? (&|and) Space|NASA) Act(ion)?'
+                      '(\s(of\s)?\(?1958)?')
+    gi_statement = re.sub(nasa_statement,'',gi_statement)
+
+    law_statements = [
+        'P(ublic|\.) [Ll](aw|\.) \d{2,3}\s?[-–]+\s?\d{2,3}',
+        ('([\(\s]\d{2,3}\s)?[Uu]\.?[Ss]\.?\s?[Cc]\.?([Pp]\.?)?\s?'
+         '(§|\.?sctn\.?|[Cc]hapter|[Ss]ec(tion|\.)?)?\s*(111-)?'
+         '\d{3,6}'),
+        ('[1-4][0-9]\s?C\.?F\.?R\.?\s?'
+         '([Ss]ec(tion|\.)|\.sctn\.|[Pp]art|§)?\s?[0-9\.-]+\s?'
+         '(\([A-Za-z]\))?\s?(\([0-9]\))?(\([ivx]{1,3}\))?'),
+        '[Ff][Aa][Rr]\s([Rr]egulation\s)?[0-9\.-]+',
+        '((\d{2,3}\s)?[Ss][Tt][Aa][Tt]?(ute)?\.?\s\d{3,4})\|?(?![\d-])',
+        'ASPR (Section\s)?7-\d{3}.\d{2}(\s?\([a-z]\))?'
+    ]
+    for law_statement in law_statements:
+         gi_statement = re.sub(law_statement,'',gi_statement)
+
+    public_law = False
+    if len(gi_statement) < len_check or gi_statement.find('Public Law')!=-1:
+        public_law = True
+
+    return gi_statement, public_law
+
+def candidates(s, tokenizer):
+    """Return the tokens of s and the indices of the tokens that contain
+    a number, that are (roughly) the potential award ids that
+    award_id_extractor() passes to addIsolated() and removeShorter()
+    """
+    tokens = tokenizer.tokenize(s)
+    idxs = [i for i,w in enumerate(tokens) if any(c.isdigit() for c in w)]
+    return tokens, idxs
+
+def benchmarks(statements, inputs, extractor):
+    """Return a list of (name, function, number of calls): each function
+    runs the benchmark on the whole corpus
+    """
+    acronyms, agencies_, nih_institutes_, zipcodes_ = inputs
+    stops = extractor.stops
+    dictionary = extractor.dictionary
+    texts = [s for s,_ in statements]
+    tokenized = [candidates(s, extractor.tokenizer) for s in texts]
+    award_ids = [[tokens[i].strip(stops) for i in idxs]
+                 for tokens,idxs in tokenized]
+
+    def extract():
+        for s,year in statements:
+            award_id_extractor(s, inputs, year)
+
+    def extract_record():
+        for s,year in statements:
+            award_id_extractor(s, inputs, year, record=True)
+
+    def find_agency():
+        for s in texts:
+            findAgency(s, agencies_, nih_institutes_)
+
+    def remove_zip():
+        for s in texts:
+            removeZip(s, zipcodes_)
+
+    def remove_dates():
+        for s in texts:
+            removeDates(s)
+
+    def exclude_laws():
+        for s in texts:
+            excludeLaws(s)
+
+    def exclude_laws_baseline():
+        for s in texts:
+            baselineExcludeLaws(s)
+
+    def add_isolated():
+        for tokens,idxs in tokenized:
+            other = [tokens[i] for i in idxs]
+            for forward in [False, True]:
+                for idx in idxs:
+                    addIsolated(tokens, idx, other,
+                                extractor.acronyms, stops=stops,
+                                forward=forward, dictionary=dictionary)
+
+    def remove_shorter():
+        for ids in award_ids:
+            removeShorter(ids[:])
+
+    for s in texts:
+        if excludeLaws(s)!=baselineExcludeLaws(s):
+            raise AssertionError(f'excludeLaws differs from the original '
+                                 f'implementation on {s!r}')
+
+    n = len(statements)
+    n_isolated = sum(2*len(idxs) for _,idxs in tokenized)
+    return [
+        ('award_id_extractor', extract, n),
+        ('award_id_extractor[record]', extract_record, n),
+        ('findAgency', find_agency, n),
+        ('removeZip', remove_zip, n),
+        ('removeDates', remove_dates, n),
+        ('excludeLaws', exclude_laws, n),
+        ('excludeLaws[baseline]', exclude_laws_baseline, n),
+        ('addIsolated', add_isolated, n_isolated),
+        ('removeShorter', remove_shorter, n)]
+
+def gitRevision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                             cwd=root, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+def main():
+    parser = argparse.ArgumentParser('award_id benchmark')
+    parser.add_argument(
+        '-s', '--sizes',
+        help = 'comma-separated corpus sizes (default: 100,1000,5000)',
+        default = '100,1000,5000')
+    parser.add_argument(
+        '-r', '--repeat',
+        help = 'number of runs of each benchmark; the fastest is ' \
+               'reported (default: 3)',
+        default = 3,
+        type = int)
+    parser.add_argument(
+        '--seed',
+        help = 'seed of the synthetic corpus (default: 0)',
+        default = 0,
+        type = int)
+    parser.add_argument(
+        '--json',
+        help = 'save the results in this JSON file')
+    parser.add_argument(
+        '--baseline',
+        help = 'JSON file produced by a previous run to compare with')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in re.split(',\s*', args.sizes)]
+    inputs = synthetic_inputs()
+    # The same extractor is used by award_id_extractor() for
+    #  all the benchmarks (as it would in a real run)
+    extractor = AwardIdExtractor(inputs)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f_in:
+            for result in json.load(f_in)['results']:
+                baseline[(result['benchmark'],result['size'])] = result
+
+    results = []
+    print(f'{"benchmark":>28} {"size":>6} {"stmts/s":>10} {"us/call":>10}' +
+          (f' {"change":>8}' if baseline else ''))
+    for size in sizes:
+        statements = synthetic_statements(size, args.seed)
+        for name,func,calls in benchmarks(statements, inputs, extractor):
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter()-start)
+            elapsed = min(timings)
+            result = {
+                'benchmark': name,
+                'size': size,
+                'calls': calls,
+                'seconds': elapsed,
+                'statements_per_second': size/elapsed,
+                'us_per_call': elapsed/max(calls,1)*1e6}
+            results.append(result)
+            line = f'{name:>28} {size:>6} ' \
+                   f'{result["statements_per_second"]:>10.0f} ' \
+                   f'{result["us_per_call"]:>10.2f}'
+            if (name,size) in baseline:
+                old = baseline[(name,size)]['us_per_call']
+                line += f' {(result["us_per_call"]/old-1)*100:>+7.1f}%'
+            print(line)
+
+    if args.json:
+        output = {
+            'revision': gitRevision(),
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'results': results}
+        with open(args.json, 'w') as f_out:
+            json.dump(output, f_out, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of crossref.get_data_from_crossref_dump on a synthetic
+ CrossRef dump, and check of its output against the one of
+ crossref.get_data_from_crossref (querying the stand-in of the
+ REST API of crossref_stub.py).
+Part of the IRIS project.
+
+The dump has the same works of crossref_stub.py (with some more
+ metadata, as in the real dump), half in .json.gz shards with the works
+ in 'items' and half in .jsonl.gz shards with a work per line.
+
+Usage: python benchmarks/crossref_dump.py [-n N_WORKS] [-s N_SHARDS]
+        [-q N_DOIS] [-c N_CORES] [--all_dois]
+
+Author: Carlo Bottai
+Copyright (c) 2021 - TU/e and EPFL
+License: See the LICENSE file.
+Date: 2021-02-08
+
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, root)
+
+from crossref_stub import StubServer, synthetic_dois, synthetic_record
+
+def synthetic_work(doi):
+    work = synthetic_record(doi)
+    work['title'] = [f'A study of {doi}']
+    work['publisher'] = 'Stub Publishing'
+    work['reference-count'] = len(doi)
+    return work
+
+def write_dump(folder, dois, n_shards):
+    """Write the works of 'dois' in n_shards shards in 'folder'"""
+    for shard in range(n_shards):
+        works = [synthetic_work(doi) for doi in dois[shard::n_shards]]
+        if shard%2==0:
+            with gzip.open(f'{folder}/{shard}.json.gz', 'wt') as f:
+                json.dump({'items': works}, f)
+        else:
+            with gzip.open(f'{folder}/{shard}.jsonl.gz', 'wt') as f:
+                for work in works:
+                    f.write(json.dumps(work) + '\n')
+
+def main():
+    from crossref import get_data_from_crossref, get_data_from_crossref_dump
+
+    parser = argparse.ArgumentParser('CrossRef dump benchmark')
+    parser.add_argument(
+        '-n', '--n_works',
+        help = 'number of works in the dump (default: 100000)',
+        default = 100000,
+        type = int)
+    parser.add_argument(
+        '-s', '--n_shards',
+        help = 'number of shards of the dump (default: 20)',
+        default = 20,
+        type = int)
+    parser.add_argument(
+        '-q', '--n_dois',
+        help = 'number of DOIs searched (default: 5000)',
+        default = 5000,
+        type = int)
+    parser.add_argument(
+        '-c', '--n_cores',
+        help = 'number of processes (default: all the cores but one)',
+        default = max(os.cpu_count()-1, 1),
+        type = int)
+    parser.add_argument(
+        '--all_dois',
+        help = 'return the DOIs without funders as well',
+        action = 'store_true')
+    args = parser.parse_args()
+
+    dois = synthetic_dois(args.n_works)
+    # Some of the DOIs searched are not in the dump
+    searched = random.Random(0).sample(dois, min(args.n_dois, len(dois)))
+    searched += [f'10.0000/stub.{i}' for i in range(args.n_dois//100)]
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_dump(folder, dois, args.n_shards)
+        start = time.perf_counter()
+        df = get_data_from_crossref_dump(folder, searched, args.all_dois,
+                                         args.n_cores)
+        elapsed = time.perf_counter()-start
+
+    with StubServer() as server:
+        start = time.perf_counter()
+        reference = get_data_from_crossref(searched, 'stub@example.org',
+                                           n_workers=8, url=server.url,
+                                           all_dois=args.all_dois)
+        elapsed_api = time.perf_counter()-start
+
+    # The rows come in a different order
+    rows = lambda df: sorted(map(tuple, df.astype(str).values.tolist()))
+    same = rows(df)==rows(reference)
+    print(f'dump: {elapsed:7.2f} s, API stub: {elapsed_api:7.2f} s, ' \
+          f'{len(df)} rows, same output: {same}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+"""
+Local stand-in of the CrossRef REST API (only the /works queries made by
+ crossref.py) and benchmark of crossref.get_data_from_crossref against it.
+Part of the IRIS project.
+
+The metadata of each DOI is generated deterministically from the DOI
+ itself: about 70% of the DOIs have one or two funders, each with zero
+ to two award IDs, while the DOIs with the prefix 10.0000 are unknown.
+ The server sends the X-Rate-Limit-* headers of CrossRef, refuses the
+ URLs longer than 8192 characters (414), can be slowed down (--latency)
+ and can fail randomly with a 429 or a 500 (--failure_rate).
+
+Usage: python benchmarks/crossref_stub.py [-n N_DOIS] [-w WORKERS]
+        [--latency SECONDS] [--failure_rate RATE] [--json FILE]
+
+Author: Carlo Bottai
+Copyright (c) 2021 - TU/e and EPFL
+License: See the LICENSE file.
+Date: 2021-02-01
+
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, root)
+
+funders = ['National Science Foundation', 'National Institutes of Health',
+           'U.S. Department of Energy', 'European Research Council']
+unknown_prefix = '10.0000/'
+
+def synthetic_dois(n, seed=0):
+    rnd = random.Random(seed)
+    return [f'10.{rnd.randint(1000,9999)}/stub.{i}' for i in range(n)]
+
+def synthetic_record(doi):
+    """Return the CrossRef record of a DOI (without funders for ~30%),
+    or None if the DOI is unknown
+    """
+    if doi.startswith(unknown_prefix):
+        return None
+    rnd = random.Random(hashlib.md5(doi.encode()).hexdigest())
+    record = {'DOI': doi}
+    if rnd.random()<.3:
+        return record
+    record['funder'] = []
+    for _ in range(rnd.randint(1,2)):
+        funder = {'name': rnd.choice(funders)}
+        n_awards = rnd.randint(0,2)
+        if n_awards>0:
+            funder['award'] = [f'{rnd.choice(["DMR","CHE","R01"])}-' \
+                               f'{rnd.randint(100000,999999)}'
+                               for _ in range(n_awards)]
+        record['funder'].append(funder)
+    return record
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b'', headers={}):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Rate-Limit-Limit', str(self.server.rate_limit))
+        self.send_header('X-Rate-Limit-Interval', '1s')
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            fail = server.rnd.random()<server.failure_rate
+        time.sleep(server.latency)
+        if fail:
+            self._send(server.rnd.choice([429, 500]), headers={'Retry-After':'0'})
+            return
+        if len(self.path)>server.max_url_length:
+            self._send(414)
+            return
+
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        filters = params.get('filter', [''])[0].split(',')
+        dois = [f[4:] for f in filters if f.startswith('doi:')]
+        has_funder = 'has-funder:true' in filters
+        rows = min(int(params.get('rows', ['20'])[0]), 1000)
+        offset = int(params.get('cursor', ['0'])[0] or 0) \
+            if 'cursor' in params and params['cursor'][0]!='*' else 0
+
+        records = [synthetic_record(doi) for doi in dois]
+        records = [record for record in records if record is not None]
+        if has_funder:
+            records = [record for record in records if 'funder' in record]
+        select = params.get('select', [None])[0]
+        if select is not None:
+            fields = select.split(',')
+            records = [{k:v for k,v in record.items() if k in fields}
+                       for record in records]
+
+        message = {'total-results': len(records),
+                   'items': records[offset:offset+rows],
+                   'items-per-page': rows}
+        if 'cursor' in params:
+            message['next-cursor'] = str(offset+rows)
+        body = json.dumps({'status': 'ok', 'message-type': 'work-list',
+                           'message': message}).encode()
+        with server.lock:
+            server.bytes_sent += len(body)
+        self._send(200, body)
+
+class StubServer(ThreadingHTTPServer):
+    """Stand-in of the CrossRef REST API, running in a background thread
+
+    Use it as a context manager: its 'url' can be passed to crossref.py
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0., failure_rate=0., rate_limit=1000, seed=0,
+                 max_url_length=8192):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.max_url_length = max_url_length
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.url = f'http://127.0.0.1:{self.server_address[1]}/works'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+def main():
+    from crossref import FetchStats, get_data_from_crossref
+
+    parser = argparse.ArgumentParser('CrossRef client benchmark')
+    parser.add_argument(
+        '-n', '--n_dois',
+        help = 'number of DOIs (default: 2000)',
+        default = 2000,
+        type = int)
+    parser.add_argument(
+        '-w', '--workers',
+        help = 'comma-separated numbers of workers (default: 1,4,8)',
+        default = '1,4,8')
+    parser.add_argument(
+        '--latency',
+        help = 'seconds the server waits before each response ' \
+               '(default: 0.05)',
+        default = .05,
+        type = float)
+    parser.add_argument(
+        '--failure_rate',
+        help = 'share of the requests answered with a 429 or 500 ' \
+               '(default: 0.05)',
+        default = .05,
+        type = float)
+    parser.add_argument(
+        '--json',
+        help = 'save the metrics of the requests of each run to this file')
+    args = parser.parse_args()
+
+    dois = synthetic_dois(args.n_dois)
+    reference = None
+    reports = {}
+    for n_workers in [int(w) for w in args.workers.split(',')]:
+        stats = FetchStats()
+        with StubServer(args.latency, args.failure_rate) as server:
+            df = get_data_from_crossref(dois, 'stub@example.org',
+                                        n_workers=n_workers, url=server.url,
+                                        stats=stats)
+        if reference is None:
+            reference = df
+        same = df.equals(reference)
+        report = stats.report()
+        reports[n_workers] = report
+        print(f'{n_workers:>3} workers: {report["seconds"]:7.2f} s, ' \
+              f'{report["requests"]} requests ' \
+              f'({report["retries"]} retries), ' \
+              f'p90 latency {report["latency"]["p90"]*1000:.0f} ms, ' \
+              f'{report["dois_per_second"]:.0f} DOIs/s, ' \
+              f'{len(df)} rows, same output: {same}')
+
+    if args.json is not None:
+        with open(args.json, 'w') as f_out:
+            json.dump(reports, f_out, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""
+Report the import time of each module of the package and its budget.
+ pandas, numpy, nltk, requests and tqdm are loaded lazily (see lazy_import.py),
+ so importing a module must not pay for them until they are really used.
+Part of the IRIS project.
+
+Usage: python benchmarks/import_time.py [-r REPEAT]
+ The budgets are enforced by tests/test_import_time.py.
+
+Author: Carlo Bottai
+Copyright (c) 2020 - TU/e and EPFL
+License: See the LICENSE file.
+Date: 2021-01-22
+
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Budgets (in ms) for the cumulative import time of each module. They are
+#  about three times the measured values, while an eager import of pandas
+#  or nltk alone costs some hundreds of ms
+budgets = {
+    'award_id': 50,
+    'award_match': 10,
+    'checksum': 10,
+    'crossref': 10,
+    'explode': 10,
+    'lazy_import': 10,
+    'nlp': 20,
+    'parse_args': 20,
+}
+
+def importTime(module):
+    # Cached bytecode is needed to measure what a user would see
+    env = {k:v for k,v in os.environ.items() \
+           if k!='PYTHONDONTWRITEBYTECODE'}
+    out = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=root, env=env, capture_output=True, text=True, check=True)
+    pattern = re.compile(
+        rf'^import time:\s+\d+ \|\s+(\d+) \| {re.escape(module)}$', re.M)
+    return int(pattern.search(out.stderr).group(1))/1000
+
+def main():
+    parser = argparse.ArgumentParser('import time benchmark')
+    parser.add_argument(
+        '-r', '--repeat',
+        help = 'number of measures for each module (default: 5)',
+        default = 5,
+        type = int)
+    args = parser.parse_args()
+
+    for module,budget in budgets.items():
+        # Warm-up run, to write the bytecode cache
+        importTime(module)
+        elapsed = min(importTime(module) for _ in range(args.repeat))
+        status = 'ok' if elapsed<=budget else 'OVER BUDGET'
+        print(f'{module:>12}: {elapsed:7.2f} ms (budget {budget} ms) {status}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""
+Micro-benchmark of award_id.removeDates against its previous implementation
+ (that compiled and applied 36 regexes for each statement).
+Part of the IRIS project.
+
+Usage: python benchmarks/remove_dates.py [-n NUMBER]
+
+Author: Carlo Bottai
+Copyright (c) 2020 - TU/e and EPFL
+License: See the LICENSE file.
+Date: 2020-11-17
+
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from award_id import removeDates
+
+def removeDatesLegacy(s):
+    months = ['January','February','March',
+              'April','May','June','July',
+              'August','September','October',
+              'November','December']
+    for month_idx,month in enumerate(months):
+        month_ = month[:]
+        month = f'[{month[:1]}{month[:1].lower()}]{month[1:3]}'
+        if len(month_)>3:
+            month = f'{month}[{month_[3:]}\.]?'
+        day = '(0?[1-9]|[12]\d|3[01])'
+        year = '(19|20)\d{2}(?!\d)'
+        date = f'{month} ({day}(-{day})?,\s)?{year}'
+        s = re.sub(date,' ',s)
+        
+        month_idx += 1
+        if month_idx<10:
+            month_idx = f'0?{month_idx}'
+        else:
+            month_idx = str(month_idx)
+        year = '(19|20)?\d{2}'
+        date_idx = f'\s\(?{month_idx}/{day}/{year}[\),;:\.]?\s'
+        s = re.sub(date_idx,' ',s)
+        s = re.sub('\s+',' ',s)
+    
+    return s
+
+statements = [
+    ('This invention was made with government support under grant '
+     'GM123456 awarded by the National Institutes of Health. '
+     'The government has certain rights in the invention.'),
+    ('This invention was made with Government support under Contract '
+     'DE-AC05-00OR22725 awarded by the U.S. Department of Energy on '
+     'Dec. 16, 2019 and amended on 03/12/2018 (see also Jan 2020).'),
+    ('The United States Government has rights in this invention pursuant '
+     'to Contract No. W-7405-ENG-48 between the United States Department '
+     'of Energy and the University of California, filed May 5-7, 2001.'),
+]
+
+def main():
+    parser = argparse.ArgumentParser('removeDates benchmark')
+    parser.add_argument(
+        '-n', '--number', 
+        help = 'number of calls for each statement (default: 2000)', 
+        default = 2000, 
+        type = int)
+    args = parser.parse_args()
+    
+    for s in statements:
+        assert removeDates(s)==removeDatesLegacy(s)
+    
+    for name,func in [('legacy',removeDatesLegacy),('current',removeDates)]:
+        elapsed = min(timeit.repeat(
+            lambda: [func(s) for s in statements], 
+            number=args.number, repeat=3))
+        us_per_call = elapsed/(args.number*len(statements))*1e6
+        print(f'{name:>8}: {us_per_call:8.2f} us/call')
+
+if __name__ == '__main__':
+    main()
@@ -9,8 +9,18 @@ Copyright (c) 2020 - TU/e and EPFL
 License: See the LICENSE file.
 Date: 2020-03-24
 
+The manifests written and verified here have the same format of the
+ md5sum command (e.g., "md5sum -c manifest.md5" verifies them as well).
+
+Usage: python checksum.py [-w WORKERS] [-o MANIFEST] FILE_OR_FOLDER [...]
+       python checksum.py [-w WORKERS] -c MANIFEST
+
 """
 
+import os
+import sys
+import time
+
 def md5sum(filename):
     """
     Author: Gertjan van den Burg
@@ -27,4 +37,223 @@ def md5sum(filename):
         while len(buf) > 0:
             hasher.update(buf)
             buf = fid.read(blocksize)
-    return hasher.hexdigest()
\ No newline at end of file
+    return hasher.hexdigest()
+
+def _md5sumFile(filename, blocksize=1<<20):
+    # The same as md5sum(), but with larger reads into a reused buffer.
+    #  hashlib releases the GIL while it hashes them, so more files
+    #  can be hashed at once by different threads
+    import hashlib
+    
+    hasher = hashlib.md5()
+    buf = bytearray(blocksize)
+    view = memoryview(buf)
+    size = 0
+    with open(filename, 'rb', buffering=0) as fid:
+        n = fid.readinto(buf)
+        while n:
+            hasher.update(view[:n])
+            size += n
+            n = fid.readinto(buf)
+    return hasher.hexdigest(), size
+
+def iter_md5sums(filenames, n_workers=os.cpu_count(), stats=None):
+    """Yield the (filename, md5 checksum) of each file, in the same order,
+    hashing up to 'n_workers' files at a time
+    
+    The checksum is None if the file cannot be read.
+    If a dict is passed as 'stats', its 'files', 'bytes' and 'seconds'
+     are updated while the files are hashed
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    def hash_file(filename):
+        try:
+            return _md5sumFile(filename)
+        except OSError:
+            return None, 0
+    
+    # filenames is read twice (to submit the files and to pair them 
+    #  with their checksums), so it can't be a generator
+    filenames = list(filenames)
+    if stats is not None:
+        for key in ['files', 'bytes', 'seconds']:
+            stats.setdefault(key, 0)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max(n_workers, 1)) as executor:
+        for filename, (checksum, size) in zip(
+                filenames, executor.map(hash_file, filenames)):
+            if stats is not None:
+                stats['files'] += 1
+                stats['bytes'] += size
+                stats['seconds'] += time.perf_counter()-start
+                start = time.perf_counter()
+            yield filename, checksum
+
+def md5sums(filenames, n_workers=os.cpu_count(), stats=None):
+    """Return a dict with the md5 checksum of each file
+    (see iter_md5sums)
+    """
+    return dict(iter_md5sums(filenames, n_workers, stats))
+
+def _escape(filename):
+    # As md5sum does, the names with backslashes, newlines or carriage 
+    #  returns are escaped and their line starts with a backslash
+    if '\\' not in filename and '\n' not in filename and '\r' not in filename:
+        return '', filename
+    filename = filename.replace('\\', '\\\\').replace('\n', '\\n')
+    return '\\', filename.replace('\r', '\\r')
+
+def _unescape(filename):
+    chars = []
+    i = 0
+    while i<len(filename):
+        if filename[i]=='\\' and i+1<len(filename):
+            chars.append({'n':'\n', 'r':'\r'}.get(filename[i+1],
+                                                   filename[i+1]))
+            i += 2
+        else:
+            chars.append(filename[i])
+            i += 1
+    return ''.join(chars)
+
+def manifest_line(filename, checksum):
+    prefix, filename = _escape(filename)
+    return f'{prefix}{checksum}  {filename}\n'
+
+def write_manifest(filenames, manifest=None, n_workers=os.cpu_count(),
+                   stats=None):
+    """Hash the files and write a manifest in the format of md5sum
+    (to 'manifest', a path or a file object, or to the standard output),
+    one line per file, in the same order
+    
+    It returns the list of the files that cannot be read
+    (that are not in the manifest)
+    """
+    failed = []
+    f_out = sys.stdout if manifest is None else manifest
+    if isinstance(manifest, str):
+        f_out = open(manifest, 'w', encoding='utf-8',
+                     errors='surrogateescape', newline='\n')
+    try:
+        for filename, checksum in iter_md5sums(filenames, n_workers, stats):
+            if checksum is None:
+                failed.append(filename)
+            else:
+                f_out.write(manifest_line(filename, checksum))
+    finally:
+        if f_out is not manifest and f_out is not sys.stdout:
+            f_out.close()
+    return failed
+
+def read_manifest(manifest):
+    """Return the list of the (filename, checksum) in a manifest
+    in the format of md5sum (the text and the binary mode)
+    """
+    import re
+    
+    line_pattern = re.compile(r'(\\?)([0-9a-fA-F]{32}) [ *](.*)')
+    entries = []
+    with open(manifest, encoding='utf-8', errors='surrogateescape',
+              newline='\n') as f_in:
+        for i, line in enumerate(f_in):
+            line = line.rstrip('\n')
+            if not line:
+                continue
+            match = line_pattern.fullmatch(line)
+            if match is None:
+                raise ValueError(f'{manifest}:{i+1}: not a line of md5sum')
+            escaped, checksum, filename = match.groups()
+            if escaped:
+                filename = _unescape(filename)
+            entries.append((filename, checksum.lower()))
+    return entries
+
+def verify_manifest(manifest, n_workers=os.cpu_count(), root=None,
+                    stats=None):
+    """Verify the files of a manifest in the format of md5sum
+    
+    The relative paths are resolved against 'root' (by default,
+     the current directory, as md5sum -c does).
+    It returns the list of the (filename, status) of the files, with status
+     'OK', 'FAILED' (different checksum) or 'MISSING' (unreadable file)
+    """
+    entries = read_manifest(manifest)
+    paths = [filename if root is None else os.path.join(root, filename)
+             for filename, _ in entries]
+    results = []
+    for (filename, expected), (_, checksum) in zip(
+            entries, iter_md5sums(paths, n_workers, stats)):
+        if checksum is None:
+            status = 'MISSING'
+        elif checksum==expected:
+            status = 'OK'
+        else:
+            status = 'FAILED'
+        results.append((filename, status))
+    return results
+
+def _expandPaths(paths):
+    # The folders are replaced by all the files they contain
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, folders, files in os.walk(path):
+                folders.sort()
+                filenames.extend(os.path.join(folder, file_name)
+                                 for file_name in sorted(files))
+        else:
+            filenames.append(path)
+    return filenames
+
+def _throughput(stats):
+    mb = stats['bytes']/1e6
+    seconds = stats['seconds']
+    return f'{stats["files"]} files, {mb:.1f} MB in {seconds:.2f} s ' \
+           f'({mb/seconds if seconds>0 else 0.:.1f} MB/s)'
+
+def main():
+    """Hash files (and folders) or verify a manifest, in parallel"""
+    import argparse
+    
+    parser = argparse.ArgumentParser('Parallel md5 checksums')
+    parser.add_argument(
+        'paths', 
+        help = 'files or folders to hash', 
+        nargs = '*')
+    parser.add_argument(
+        '-c', '--check', 
+        help = 'verify the files of this manifest')
+    parser.add_argument(
+        '-o', '--output', 
+        help = 'write the manifest to this file (default: standard output)')
+    parser.add_argument(
+        '-w', '--workers', 
+        help = 'number of files hashed at a time (default: number of cores)', 
+        default = os.cpu_count(), 
+        type = int)
+    args = parser.parse_args()
+    
+    stats = {}
+    if args.check is not None:
+        results = verify_manifest(args.check, args.workers, stats=stats)
+        for filename, status in results:
+            prefix, filename = _escape(filename)
+            print(f'{prefix}{filename}: {status}')
+        n_failed = sum(status!='OK' for _, status in results)
+        if n_failed>0:
+            print(f'{n_failed} of {len(results)} files did NOT match', 
+                  file=sys.stderr)
+    else:
+        failed = write_manifest(_expandPaths(args.paths), args.output, 
+                                args.workers, stats)
+        for filename in failed:
+            print(f'{filename}: cannot be read', file=sys.stderr)
+        n_failed = len(failed)
+    print(_throughput(stats), file=sys.stderr)
+    
+    if n_failed>0:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
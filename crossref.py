@@ -12,46 +12,780 @@ Date: 2021-01-07
 
 """
 
-import numpy as np
-import pandas as pd
-import requests
+import hashlib
+import os
+import random
+import re
+import threading
 import time
-from tqdm import tqdm
+from array import array
+from contextlib import contextmanager
+from urllib.parse import quote
 
-def get_data_from_crossref(dois_list, email_addr):
-    dois_chunks = [dois_list[i:i+100] for i in range(0, len(dois_list), 100)]
-    df_with_award_ids = []
-    for dois_chunk in tqdm(dois_chunks):
-        dois = ','.join([f'doi:{doi}' for doi in dois_chunk])
-        query = 'https://api.crossref.org/works?' \
-                f'filter={dois},has-funder:true&' \
-                'select=DOI,funder&' \
-                f'mailto={email_addr}'
+try:
+    from .lazy_import import LazyModule
+except ImportError:
+    from lazy_import import LazyModule
+
+# These are imported only the first time they are used
+mp = LazyModule('multiprocessing')
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+requests = LazyModule('requests')
+tqdm = LazyModule('tqdm')
+
+class RateLimiter:
+    """Space the requests of all the threads according to the limits
+    that CrossRef reports in the X-Rate-Limit-Limit (number of requests)
+    and X-Rate-Limit-Interval (e.g., '1s') headers of its responses
+    """
+
+    def __init__(self, limit=None, interval=1.):
+        self._lock = threading.Lock()
+        self._next = 0.
+        self.delay = interval/limit if limit else 0.
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.delay
+        if start>now:
+            time.sleep(start-now)
+
+    def update(self, headers):
+        try:
+            limit = int(headers['X-Rate-Limit-Limit'])
+            interval = re.fullmatch(r'\s*(\d+(?:\.\d*)?)\s*(ms|s|m)?\s*',
+                                    headers['X-Rate-Limit-Interval'])
+            unit = {'ms':.001, 's':1., 'm':60., None:1.}[interval.group(2)]
+            interval = float(interval.group(1))*unit
+        except (KeyError, ValueError, AttributeError):
+            return
+        if limit>0:
+            self.delay = interval/limit
+
+class FetchStats:
+    """Collect the metrics of the requests of a CrossrefClient
+    (shared by all its threads)
+
+    Pass it as 'stats' to get_data_from_crossref() (or to the client)
+     and read the results with report() or to_json(). For each request,
+     the latency, the status code (or the name of the exception raised),
+     the bytes received and whether it is a retry are recorded.
+    If a 'callback' is given, it is called with a dict with these values
+     after each request, from the thread that made it
+    """
+
+    # Upper bounds (in seconds) of the buckets of the latency histogram
+    buckets = (.05, .1, .25, .5, 1., 2.5, 5., 10., 30., float('inf'))
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.statuses = {}
+        self.latencies = array('d')
+        self.bytes = 0
+        self.backoff_seconds = 0.
+        self.chunks = 0
+        self.dois = 0
+        self.cached_dois = 0
+        self.started = None
+        self.stopped = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.stopped = None
+
+    def stop(self):
+        self.stopped = time.perf_counter()
+
+    def request(self, latency, status, n_bytes, attempt):
+        with self._lock:
+            self.requests += 1
+            self.retries += attempt>0
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.latencies.append(latency)
+            self.bytes += n_bytes
+        if self.callback is not None:
+            self.callback({'latency': latency, 'status': status,
+                           'bytes': n_bytes, 'attempt': attempt})
+
+    def backoff(self, seconds):
+        with self._lock:
+            self.backoff_seconds += seconds
+
+    def failure(self):
+        # A request that is not retried any more
+        with self._lock:
+            self.failures += 1
+
+    def chunk(self, n_dois):
+        with self._lock:
+            self.chunks += 1
+            self.dois += n_dois
+
+    def cached(self, n_dois):
+        with self._lock:
+            self.cached_dois += n_dois
+
+    def report(self):
+        """Return a dict with the counts, the latency histogram
+        and percentiles, and the throughput of the requests
+        """
+        latencies = sorted(self.latencies)
+        percentile = lambda q: \
+            latencies[min(int(q*len(latencies)), len(latencies)-1)] \
+            if latencies else None
+        histogram = {}
+        i = 0
+        for bound in self.buckets:
+            n = 0
+            while i<len(latencies) and latencies[i]<=bound:
+                n += 1
+                i += 1
+            label = f'<={bound}s' if bound<float('inf') else \
+                    f'>{self.buckets[-2]}s'
+            histogram[label] = n
+        if self.started is None:
+            seconds = 0.
+        else:
+            seconds = (self.stopped or time.perf_counter())-self.started
+        return {'requests': self.requests,
+                'retries': self.retries,
+                'failures': self.failures,
+                'statuses': {str(status): n
+                             for status, n in sorted(self.statuses.items(),
+                                                     key=lambda x: str(x[0]))},
+                'bytes': self.bytes,
+                'backoff_seconds': self.backoff_seconds,
+                'chunks': self.chunks,
+                'dois': self.dois,
+                'cached_dois': self.cached_dois,
+                'seconds': seconds,
+                'dois_per_second': self.dois/seconds if seconds>0 else 0.,
+                'latency': {'mean': sum(latencies)/len(latencies)
+                                    if latencies else None,
+                            'p50': percentile(.5),
+                            'p90': percentile(.9),
+                            'p99': percentile(.99),
+                            'max': latencies[-1] if latencies else None,
+                            'histogram': histogram}}
+
+    def to_json(self, path=None):
+        import json
+
+        report = json.dumps(self.report(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f_out:
+                f_out.write(report)
+        return report
+
+class CrossrefClient:
+    """Client of the CrossRef REST API used by get_data_from_crossref()
+
+    Each thread uses its own requests.Session (so the connections are
+     kept alive and reused), and all of them share a RateLimiter.
+    A failed request is retried up to 'max_retries' times (forever,
+     if None), waiting an exponential backoff with full jitter
+     (a random time between 0 and backoff*2**attempt seconds,
+     up to max_backoff), or the Retry-After sent by CrossRef, if longer.
+    The DOIs are queried in chunks as large as the URLs allow
+     (max_url_length characters), and the works of each chunk are
+     requested in pages of up to max_rows, following the cursor of
+     CrossRef if they don't fit in one. A chunk whose URL is refused
+     anyway (414 URI Too Long) is split in two.
+    With all_dois, the works without funders are returned as well,
+     so that the DOIs unknown to CrossRef can be told apart.
+    The metrics of the requests are collected in 'stats' (a FetchStats).
+    'url' can point to a stand-in server (see benchmarks/crossref_stub.py)
+    """
+
+    url = 'https://api.crossref.org/works'
+
+    def __init__(self, email_addr, n_workers=1, max_retries=None, backoff=1.,
+                 max_backoff=60., timeout=5, url=None, all_dois=False,
+                 max_url_length=4096, max_rows=1000, stats=None):
+        self.email_addr = email_addr
+        self.n_workers = n_workers
+        self.all_dois = all_dois
+        self.max_url_length = max_url_length
+        self.max_rows = max_rows
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        if url is not None:
+            self.url = url
+        self.stats = stats
+        self.rate_limiter = RateLimiter()
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def query(self, dois_chunk, cursor='*'):
+        # CrossRef returns 20 works per page, unless 'rows' is set
+        dois = ','.join([f'doi:{quote(doi, safe="/:")}' for doi in dois_chunk])
+        has_funder = '' if self.all_dois else ',has-funder:true'
+        return f'{self.url}?' \
+               f'filter={dois}{has_funder}&' \
+               'select=DOI,funder&' \
+               f'rows={min(len(dois_chunk), self.max_rows)}&' \
+               f'cursor={quote(cursor, safe="")}&' \
+               f'mailto={self.email_addr}'
+
+    def chunks(self, dois_list):
+        """Split dois_list in chunks whose queries are not longer
+        than max_url_length (each chunk has at least one DOI)
+        """
+        # Room is left for the cursors of the next pages
+        size = len(self.query([], cursor='*'*256))
+        dois_chunks = []
+        dois_chunk = []
+        length = size
+        for doi in dois_list:
+            length_ = len(f'doi:{quote(doi, safe="/:")},')
+            if dois_chunk and length+length_>self.max_url_length:
+                dois_chunks.append(dois_chunk)
+                dois_chunk = []
+                length = size
+            dois_chunk.append(doi)
+            length += length_
+        if dois_chunk:
+            dois_chunks.append(dois_chunk)
+        return dois_chunks
+
+    def _backoffTime(self, attempt, response):
+        delay = random.uniform(0, min(self.max_backoff,
+                                      self.backoff*2**attempt))
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers['Retry-After']))
+            except (KeyError, ValueError):
+                pass
+        return delay
+
+    def get(self, query):
+        attempt = 0
         while True:
+            self.rate_limiter.wait()
+            response = None
+            start = time.perf_counter()
             try:
-                response = requests.get(query, timeout=5)
+                response = self._session().get(query, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = e
+                if self.stats is not None:
+                    self.stats.request(time.perf_counter()-start,
+                                       type(e).__name__, 0, attempt)
+            else:
+                if self.stats is not None:
+                    self.stats.request(time.perf_counter()-start,
+                                       response.status_code,
+                                       len(response.content), attempt)
+                self.rate_limiter.update(response.headers)
                 if response.status_code==200:
-                    break
+                    return response
+                error = requests.HTTPError(
+                    f'{response.status_code} {response.reason} ' \
+                    f'for url: {response.url}', response=response)
+                # A query too long would be refused again
+                if response.status_code==414:
+                    raise error
+            if self.max_retries is not None and attempt>=self.max_retries:
+                if self.stats is not None:
+                    self.stats.failure()
+                raise error
+            delay = self._backoffTime(attempt, response)
+            if self.stats is not None:
+                self.stats.backoff(delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def fetch_message(self, dois_chunk):
+        """Return the message of the response of CrossRef, with the
+        items of all its pages (the works in dois_chunk that have
+        a funder, or all of them with all_dois)
+        """
+        try:
+            message = self.get(self.query(dois_chunk)).json()['message']
+        except requests.HTTPError as e:
+            if e.response.status_code!=414 or len(dois_chunk)<2:
+                raise
+            half = len(dois_chunk)//2
+            messages = [self.fetch_message(dois_chunk[:half]),
+                        self.fetch_message(dois_chunk[half:])]
+            return {'total-results': sum(message['total-results']
+                                         for message in messages),
+                    'items': messages[0]['items'] + messages[1]['items']}
+        page = message
+        while (len(message['items'])<message.get('total-results', 0) and
+               page['items'] and 'next-cursor' in page):
+            page = self.get(self.query(dois_chunk, page['next-cursor']))
+            page = page.json()['message']
+            message['items'].extend(page['items'])
+        if self.stats is not None:
+            self.stats.chunk(len(dois_chunk))
+        return message
+
+    def fetch(self, dois_chunk):
+        """Return the records (dicts with the DOI and the list of
+        its award IDs) of the DOIs in dois_chunk that have a funder
+        """
+        return records(self.fetch_message(dois_chunk)['items'])
+
+    def map(self, func, dois_chunks):
+        """Yield func(dois_chunk) for each chunk, in the same order
+        (the chunks are processed concurrently by n_workers threads)
+        """
+        if self.n_workers<=1:
+            results = map(func, dois_chunks)
+            executor = None
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+
+            executor = ThreadPoolExecutor(self.n_workers)
+            results = executor.map(func, dois_chunks)
+        try:
+            yield from tqdm.tqdm(results, total=len(dois_chunks))
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def _records(self, works, misses):
+        # With all_dois, the DOIs that CrossRef doesn't know are
+        #  recorded too, and each record says if the DOI was found
+        df = records(works)
+        if self.all_dois:
+            for record in df:
+                record['found'] = True
+            df.extend({'doi': doi, 'award_id': [np.nan], 'found': False}
+                      for doi in misses)
+        return df
+
+    def fetch_all(self, dois_chunks):
+        """Return the records of all the chunks, in the same order"""
+        df_with_award_ids = []
+        messages = self.map(self.fetch_message, dois_chunks)
+        for dois_chunk, message in zip(dois_chunks, messages):
+            returned = {item['DOI'].lower() for item in message['items']}
+            df_with_award_ids.extend(self._records(
+                message['items'],
+                [doi for doi in dois_chunk if doi.lower() not in returned]))
+        return df_with_award_ids
+
+    def iter_works(self, dois_list, cache=None):
+        """Yield dictionaries with the works (None for the ones not
+        returned by CrossRef) by lowercase DOI, one per chunk of DOIs
+        (the works found in the cache, if any, come first)
+
+        The works received are added to the cache (a CrossrefCache)
+         as soon as each chunk is received, so an interrupted run can
+         be resumed. The cache is read in batches as well, and only
+         the DOIs found are kept in memory
+        """
+        found = set()
+        if cache is not None:
+            for works in cache.iter_get(dois_list, self.all_dois):
+                if self.stats is not None:
+                    self.stats.cached(len(works))
+                if works:
+                    found.update(works)
+                    yield works
+        missing = list(dict.fromkeys(doi.lower() for doi in dois_list
+                                     if doi.lower() not in found))
+        dois_chunks = self.chunks(missing)
+        messages = self.map(self.fetch_message, dois_chunks)
+        for dois_chunk, message in zip(dois_chunks, messages):
+            works = {item['DOI'].lower():item for item in message['items']}
+            # The DOIs not returned have no funder (or, with all_dois,
+            #  are unknown to CrossRef), unless the results were cut short
+            if message.get('total-results', 0)<=len(message['items']):
+                for doi in dois_chunk:
+                    works.setdefault(doi, None)
+            if cache is not None:
+                cache.put(works, self.all_dois)
+            yield works
+
+    def fetch_cached(self, dois_list, cache):
+        """Return the records of the DOIs in dois_list, in the same order
+
+        Only the DOIs that are not in the cache (a CrossrefCache)
+         are queried (see iter_works)
+        """
+        found = {}
+        for works in self.iter_works(dois_list, cache):
+            found.update(works)
+        works = []
+        misses = []
+        # The misses keep the DOIs as they are in dois_list 
+        #  (the works are found by lowercase DOI)
+        for doi in dict.fromkeys(dois_list):
+            work = found.get(doi.lower())
+            if work is None:
+                misses.append(doi)
+            elif self.all_dois or 'funder' in work:
+                works.append(work)
+        return self._records(works, misses)
+
+class CrossrefCache:
+    """On-disk (SQLite) cache of the works of CrossRef, by DOI
+
+    The work of each DOI (with its funders and award IDs) is stored as
+     it is returned by CrossRef, and the DOIs not returned are stored
+     as well (with a NULL work), so that they are not queried again.
+    Since a DOI may be missing from the works with funders either
+     because it has none or because CrossRef doesn't know it, 'found'
+     is NULL for the former and 0 for the DOIs that were not returned
+     even with all_dois (which queries them again otherwise).
+    With a 'ttl' (in seconds), the works stored before that are
+     considered missing (and queried again)
+    """
+
+    def __init__(self, path, ttl=None):
+        import sqlite3
+
+        self.path = path
+        self.ttl = ttl
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS works '
+                '(doi TEXT PRIMARY KEY, work TEXT, found INTEGER, '
+                'fetched REAL)')
+            columns = [column[1] for column in self._connection.execute(
+                'PRAGMA table_info(works)')]
+            # Caches written before 'found' was added
+            if 'found' not in columns:
+                self._connection.execute(
+                    'ALTER TABLE works ADD COLUMN found INTEGER')
+
+    def get(self, dois, all_dois=False):
+        """Return a dictionary with the works (None for the ones
+        not returned by CrossRef) of the DOIs found, by lowercase DOI
+        """
+        found = {}
+        for works in self.iter_get(dois, all_dois):
+            found.update(works)
+        return found
+
+    def iter_get(self, dois, all_dois=False):
+        """Yield the same dictionaries of get(), one per batch of
+        (up to 900) DOIs, so that they don't need to be in memory at once
+        """
+        import json
+
+        dois = list({doi.lower() for doi in dois})
+        oldest = -1 if self.ttl is None else time.time()-self.ttl
+        known = ' AND found IS NOT NULL' if all_dois else ''
+        # SQLite doesn't accept more than 999 parameters per query
+        for i in range(0, len(dois), 900):
+            dois_ = dois[i:i+900]
+            rows = self._connection.execute(
+                f'SELECT doi, work FROM works WHERE fetched>=?{known} '
+                f"AND doi IN ({','.join('?'*len(dois_))})", [oldest] + dois_)
+            yield {doi: None if work is None else json.loads(work)
+                   for doi, work in rows}
+
+    def put(self, works, all_dois=False):
+        """Store the works of a dictionary by (lowercase) DOI
+        (all_dois tells if the DOIs without funders were queried too)
+        """
+        import json
+
+        now = time.time()
+        not_found = 0 if all_dois else None
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO works (doi, work, found, fetched) '
+                'VALUES (?, ?, ?, ?)',
+                [(doi, None, not_found, now) if work is None else
+                 (doi, json.dumps(work), 1, now)
+                 for doi, work in works.items()])
+
+    def __len__(self):
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM works').fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+def records(results):
+    """Return the records (dicts with the DOI and the list of
+    its award IDs) of the works returned by CrossRef
+    """
+    df = []
+    for result in results:
+        if 'funder' in result.keys():
+            awards = []
+            for funder in result['funder']:
+                if 'award' in funder.keys():
+                    awards.extend(funder['award'])
                 else:
-                    time.sleep(10)
-            except:
-                time.sleep(10)
-        results = response.json()['message']['items']
-        df = []
-        for result in results:
-            if 'funder' in result.keys():
-                awards = []
-                for funder in result['funder']:
-                    if 'award' in funder.keys():
-                        awards.extend(funder['award'])
-                    else:
-                        awards.append(np.nan)
-                df.append({'doi': result['DOI'], 'award_id': awards})
+                    awards.append(np.nan)
+            df.append({'doi': result['DOI'], 'award_id': awards})
+        else:
+            df.append({'doi': result['DOI'], 'award_id': [np.nan]})
+    return df
+
+def flat_rows(results):
+    """Return the (DOI, funder, award ID) rows of the works returned by
+    CrossRef (with None as award ID for the funders without award IDs,
+    and as funder too for the works without funders)
+    """
+    rows = []
+    for result in results:
+        n_rows = len(rows)
+        for funder in result.get('funder', []):
+            name = funder.get('name')
+            for award_id in funder.get('award', [None]):
+                rows.append((result['DOI'], name, award_id))
+        if len(rows)==n_rows:
+            rows.append((result['DOI'], None, None))
+    return rows
+
+@contextmanager
+def _openCache(cache, ttl):
+    # A CrossrefCache opened here (from its path) is closed here as well
+    if cache is None or isinstance(cache, CrossrefCache):
+        yield cache
+        return
+    cache = CrossrefCache(cache, ttl)
+    try:
+        yield cache
+    finally:
+        cache.close()
+
+def get_data_from_crossref(dois_list, email_addr, n_workers=1,
+                           max_retries=None, url=None, cache=None, ttl=None,
+                           all_dois=False, max_url_length=4096, stats=None):
+    """Return a dataframe with the award IDs (one per row) of the DOIs
+    in dois_list that have a funder, according to CrossRef
+
+    The DOIs are queried in chunks (as many as fit in URLs of up to
+     'max_url_length' characters), by 'n_workers' threads
+     (see CrossrefClient for the paging, the retries and the rate limits).
+    A query that still fails after 'max_retries' retries raises
+     the last requests exception (None retries forever).
+    With 'all_dois', every DOI of dois_list has at least one row: the ones
+     without funders have no award ID, and the column 'found' is False
+     for the DOIs unknown to CrossRef.
+    With a 'cache' (the path of a SQLite file or a CrossrefCache),
+     only the DOIs not found in it (or older than 'ttl' seconds)
+     are queried, and the rows follow the order of dois_list.
+    The metrics of the requests are collected in 'stats' (a FetchStats)
+    """
+    if stats is not None:
+        stats.start()
+    with CrossrefClient(email_addr, n_workers=n_workers,
+                        max_retries=max_retries, url=url, all_dois=all_dois,
+                        max_url_length=max_url_length, stats=stats) as client:
+        if cache is None:
+            df_with_award_ids = client.fetch_all(client.chunks(dois_list))
+        else:
+            with _openCache(cache, ttl) as cache:
+                df_with_award_ids = client.fetch_cached(dois_list, cache)
+    if stats is not None:
+        stats.stop()
+    df_with_award_ids = pd.DataFrame(df_with_award_ids)
+    df_with_award_ids = df_with_award_ids.explode('award_id')
+    df_with_award_ids.drop_duplicates(inplace=True)
+
+    return df_with_award_ids
+
+def iter_crossref_rows(dois_list, email_addr, n_workers=1, max_retries=None,
+                       url=None, cache=None, ttl=None, all_dois=False,
+                       max_url_length=4096, stats=None):
+    """Yield, for each chunk of DOIs, the list of the (DOI, funder,
+    award ID) rows of its works, as soon as it is received
+    (see get_data_from_crossref for the arguments)
+
+    A funder without award IDs has a row with None as award ID,
+     and, with 'all_dois', a work without funders has a row with None
+     as funder too, while the DOIs unknown to CrossRef have no rows.
+    The rows are not deduplicated across chunks
+    """
+    if stats is not None:
+        stats.start()
+    with CrossrefClient(email_addr, n_workers=n_workers,
+                        max_retries=max_retries, url=url, all_dois=all_dois,
+                        max_url_length=max_url_length, stats=stats) as client, \
+         _openCache(cache, ttl) as cache:
+        for works in client.iter_works(dois_list, cache):
+            yield flat_rows([work for work in works.values()
+                             if work is not None and
+                             (all_dois or 'funder' in work)])
+    if stats is not None:
+        stats.stop()
+
+def write_crossref_rows(dois_list, email_addr, path, **kwargs):
+    """Write the (doi, funder, award_id) rows of the DOIs in dois_list
+    to 'path' chunk by chunk, as soon as they are received from CrossRef
+    (the other arguments are passed to iter_crossref_rows)
+
+    The file is a Parquet file if 'path' ends with .parquet (pyarrow is
+     needed), a TSV or CSV file otherwise (the compression, e.g., gzip,
+     is inferred from the file extension).
+    The duplicated rows are dropped keeping only a hash of each row
+     written, so the memory needed doesn't depend on their content.
+    It returns the number of rows written
+    """
+    columns = ['doi', 'funder', 'award_id']
+    seen = set()
+    n_rows = 0
+    writer = None
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(column, pa.string()) for column in columns])
+        writer = pq.ParquetWriter(path, schema)
+    sep = '\t' if '.tsv' in path else ','
+    header = True
+    try:
+        for rows in iter_crossref_rows(dois_list, email_addr, **kwargs):
+            new_rows = []
+            for row in rows:
+                key = hashlib.blake2b(repr(row).encode(),
+                                      digest_size=16).digest()
+                if key not in seen:
+                    seen.add(key)
+                    new_rows.append(row)
+            df = pd.DataFrame(new_rows, columns=columns, dtype=object)
+            if writer is not None:
+                writer.write_table(pa.Table.from_pandas(
+                    df, schema=schema, preserve_index=False))
             else:
-                df.append({'doi': result['DOI'], 'award_id': [np.nan]})
-        df_with_award_ids.extend(df)
+                df.to_csv(path, sep=sep, index=False,
+                          mode='w' if header else 'a', header=header)
+                header = False
+            n_rows += len(new_rows)
+        # Nothing was received, but the file must have the header anyway
+        if writer is None and header:
+            pd.DataFrame(columns=columns).to_csv(path, sep=sep, index=False)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_rows
+
+# The DOIs searched in the dump (and the mode), set once in each worker
+_dump_dois = None
+_dump_all_dois = False
+
+def _init_dump_worker(dois, all_dois):
+    global _dump_dois, _dump_all_dois
+    _dump_dois = dois
+    _dump_all_dois = all_dois
+
+def _dumpShards(dump):
+    if isinstance(dump, str):
+        if not os.path.isdir(dump):
+            return [dump]
+        return sorted(os.path.join(dump, file_name)
+                      for file_name in os.listdir(dump)
+                      if re.search(r'\.jsonl?(\.gz)?$', file_name))
+    return list(dump)
+
+def _read_dump_shard(shard):
+    # A shard is a JSON file with the works in 'items' (as the public
+    #  data files of CrossRef) or a JSON Lines file with one work per line,
+    #  that is read a line at a time (so, only a work is in memory at once).
+    #  Only the DOI and the funders of the works searched are kept
+    import gzip
+    import json
+
+    works = []
+    opener = gzip.open if shard.endswith('.gz') else open
+    with opener(shard, 'rt', encoding='utf-8') as f:
+        if not re.search(r'\.jsonl(\.gz)?$', shard):
+            items = json.load(f)
+            if isinstance(items, dict):
+                items = items['items']
+        else:
+            items = (json.loads(line) for line in f
+                     # Most of the works have no funders
+                     if line.strip() and (_dump_all_dois or '"funder"' in line))
+        for item in items:
+            if item['DOI'].lower() not in _dump_dois:
+                continue
+            if 'funder' in item:
+                works.append({'DOI': item['DOI'], 'funder': item['funder']})
+            elif _dump_all_dois:
+                works.append({'DOI': item['DOI']})
+    return works
+
+def iter_crossref_dump(dump, dois_list, all_dois=False,
+                       n_cores=os.cpu_count()-1):
+    """Yield, for each shard of a CrossRef dump, the works (with their
+    DOI and funders) of the DOIs in dois_list that have a funder
+    (or all of them, with all_dois)
+
+    'dump' is a folder with the shards (gzipped or not, .json files with
+     the works in 'items', as the public data files of CrossRef, or .jsonl
+     files with a work per line), or a list of their paths.
+    The shards are read by a pool of 'n_cores' processes
+    """
+    shards = _dumpShards(dump)
+    dois = {doi.lower() for doi in dois_list}
+    if n_cores<=1:
+        _init_dump_worker(dois, all_dois)
+        yield from tqdm.tqdm(map(_read_dump_shard, shards), total=len(shards))
+    else:
+        with mp.Pool(n_cores, initializer=_init_dump_worker,
+                     initargs=(dois, all_dois)) as pool:
+            yield from tqdm.tqdm(pool.imap(_read_dump_shard, shards),
+                                 total=len(shards))
+
+def get_data_from_crossref_dump(dump, dois_list, all_dois=False,
+                                n_cores=os.cpu_count()-1):
+    """Return the same dataframe as get_data_from_crossref, but reading
+    the works from the shards of a local CrossRef dump instead of
+    querying the CrossRef REST API (see iter_crossref_dump)
+
+    The rows follow the order of the shards. With 'all_dois', the column
+     'found' is False for the DOIs that are not in the dump
+    """
+    df_with_award_ids = []
+    returned = set()
+    for works in iter_crossref_dump(dump, dois_list, all_dois, n_cores):
+        df_with_award_ids.extend(records(works))
+        returned.update(work['DOI'].lower() for work in works)
+    if all_dois:
+        for record in df_with_award_ids:
+            record['found'] = True
+        misses = dict.fromkeys(doi for doi in dois_list
+                               if doi.lower() not in returned)
+        df_with_award_ids.extend({'doi': doi, 'award_id': [np.nan],
+                                  'found': False} for doi in misses)
     df_with_award_ids = pd.DataFrame(df_with_award_ids)
     df_with_award_ids = df_with_award_ids.explode('award_id')
     df_with_award_ids.drop_duplicates(inplace=True)
 
-    return df_with_award_ids
\ No newline at end of file
+    return df_with_award_ids
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+"""
+Modules to delay the import of heavy dependencies (e.g., pandas or nltk)
+  until they are actually used.
+Part of the IRIS project.
+
+Author: Carlo Bottai
+Copyright (c) 2021 - TU/e and EPFL
+License: See the LICENSE file.
+Date: 2021-01-22
+
+"""
+
+import importlib
+
+class LazyModule:
+    """Stand-in for a module, that is imported only the first time 
+    one of its attributes is used (e.g., np = LazyModule('numpy'))
+    
+    The attributes are then stored in the stand-in itself, 
+     so that using them again costs as much as using the module
+    """
+    
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+    
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return module
+    
+    def __getattr__(self, attr):
+        value = getattr(self._load(), attr)
+        self.__dict__[attr] = value
+        return value
+    
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
@@ -12,14 +12,20 @@ Date: 2021-01-22
 
 """
 
-import numpy as np
-import pandas as pd
 import re
 import string
 import unicodedata
-from nltk.metrics import edit_distance
-from nltk.tokenize import word_tokenize
-from nltk.tokenize.treebank import TreebankWordDetokenizer
+
+try:
+    from .lazy_import import LazyModule
+except ImportError:
+    from lazy_import import LazyModule
+
+# These are imported only the first time they are used
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+nltk_metrics = LazyModule('nltk.metrics')
+nltk_tokenize = LazyModule('nltk.tokenize')
 
 def standardize_legal_type(s):
     s_list = s.split(' ')
@@ -63,12 +69,12 @@ def checkspell_legal_entity_type(s):
         'UNION',
         'SYNDICATE',
         'BANK']
-    detokenizer = TreebankWordDetokenizer()
+    detokenizer = nltk_tokenize.treebank.TreebankWordDetokenizer()
     for legal_entity_type in legal_entity_types:
-        legal_entity_type_len = len(word_tokenize(legal_entity_type))
+        legal_entity_type_len = len(nltk_tokenize.word_tokenize(legal_entity_type))
         legal_entity_type_to_check = detokenizer.detokenize(
-            word_tokenize(s)[-legal_entity_type_len:])
-        if edit_distance(legal_entity_type, legal_entity_type_to_check)==1:
+            nltk_tokenize.word_tokenize(s)[-legal_entity_type_len:])
+        if nltk_metrics.edit_distance(legal_entity_type, legal_entity_type_to_check)==1:
             return s.replace(legal_entity_type_to_check, legal_entity_type)
     return s
 
@@ -15,8 +15,11 @@ Date: 2020-03-24
 import argparse
 
 
-def parse_io():
-    parser = argparse.ArgumentParser('Names Fixer')
+def io_parser(prog='Names Fixer'):
+    """Return the parser of the input/output arguments, 
+    so that a script can add its own arguments to it
+    """
+    parser = argparse.ArgumentParser(prog)
     
     parser.add_argument(
         '-i', '--input', 
@@ -42,4 +45,10 @@ def parse_io():
         required = False
     )
     
+    return parser
+
+
+def parse_io():
+    parser = io_parser()
+    
     return parser.parse_args()
@@ -0,0 +1,176 @@
+import os
+import random
+import sys
+
+import pytest
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, root)
+
+import award_id
+
+acronyms = frozenset(['NIH', 'NSF', 'DOE', 'CA'])
+stops = '.,;:'
+# addIsolated() looks in the dictionary only for the word after 'and'
+dictionary = frozenset(['and', 'the', 'grant'])
+
+def test_add_isolated_joins_the_neighbours():
+    tokens = ['under', 'grant', 'AA', '1111', 'and', '2222', 'from', 'NIH']
+    assert award_id.addIsolated(tokens, 3, ['1111', '2222'], acronyms, 
+                                stops, dictionary=dictionary)==\
+        ['AA+1111', 'AA+2222']
+    assert award_id.addIsolated(tokens, 2, ['1111', '2222'], acronyms, 
+                                stops, forward=True, 
+                                dictionary=dictionary)==['AA+1111']
+    # An acronym is not attached
+    assert award_id.addIsolated(tokens, 7, ['1111'], acronyms, stops, 
+                                dictionary=dictionary)=='NIH'
+
+def test_isolated_expander_is_the_same_for_any_order_of_the_calls():
+    vocabulary = ['AA', 'CA', '1234', '12', '5678.', 'and', 'NIH', 'R01', 
+                  'GM', 'the', 'X-1', 'AB,', '12;', ':CD', '99999', 'A/B', 
+                  'DMR', '3', 'NSF.', '.5']
+    rnd = random.Random(0)
+    for _ in range(2000):
+        tokens = [rnd.choice(vocabulary) for _ in range(rnd.randint(1,15))]
+        other = [token for token in tokens if rnd.random()<.5]
+        expander = award_id.IsolatedExpander(tokens, other, acronyms, stops, 
+                                             dictionary)
+        for forward in [False, True]:
+            for idx in rnd.sample(range(len(tokens)), len(tokens)):
+                assert expander.expand(idx, forward)==\
+                    award_id.addIsolated(tokens, idx, other, acronyms, stops, 
+                                         forward, dictionary)
+
+def test_long_chains_of_numbers_do_not_recurse():
+    tokens = ['AA'] + [str(1000+i) for i in range(5000)]
+    expanded = award_id.addIsolated(tokens, len(tokens)-1, [], acronyms, 
+                                    stops, dictionary=dictionary)
+    assert expanded==['+'.join(tokens)]
+    expanded = award_id.addIsolated(tokens, 0, [], acronyms, stops, 
+                                    forward=True, dictionary=dictionary)
+    assert expanded==['+'.join(tokens)]
+
+inputs = (['NIH', 'NSF', 'SBIR'],
+          award_id.AgencyTable(('NIH', 'NSF'), 
+                               ('National Institutes of Health', 
+                                'National Science Foundation')),
+          award_id.AgencyTable(('NCI',), ('National Cancer Institute',)),
+          award_id.ZipcodeTable(('Bethesda',), ('20810|20814',)))
+
+def _fillCache(path, inputs):
+    cache = award_id.AwardIdCache(path, inputs)
+    key = cache.key('This  work was supported by  NIH grant CA123456', 2019)
+    cache.put({key: award_id.AwardIdRecord('CA123456', False, 'NIH', 
+                                           False, '')})
+    return cache, key
+
+def test_award_id_cache_is_kept_when_nothing_changes(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache, key = _fillCache(path, inputs)
+    cache.close()
+    cache = award_id.AwardIdCache(path, inputs)
+    assert cache.get([key])=={key: award_id.AwardIdRecord(
+        'CA123456', False, 'NIH', False, '')}
+    # The blank spaces don't change the key
+    assert cache.key('This work was supported by NIH grant CA123456', 
+                     2019)==key
+
+def test_award_id_cache_is_emptied_when_the_normalization_changes(
+        tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache.sqlite')
+    cache, _ = _fillCache(path, inputs)
+    cache.close()
+    monkeypatch.setattr(award_id.TextNormalizer, 'version', 
+                        award_id.TextNormalizer.version + '-changed')
+    assert len(award_id.AwardIdCache(path, inputs))==0
+
+def test_award_id_cache_is_emptied_when_the_inputs_change(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache, _ = _fillCache(path, inputs)
+    cache.close()
+    acronyms, agencies, nih_institutes, zipcodes = inputs
+    inputs_ = (acronyms + ['DOE'], agencies, nih_institutes, zipcodes)
+    assert len(award_id.AwardIdCache(path, inputs_))==0
+
+def test_normalization_of_a_series_is_the_same_as_of_each_statement():
+    import pandas as pd
+    
+    statements = ['Grant No. AB-1234&amp;CD&ndash;5678 from the NIH ', 
+                  'Supported by NSF&mdash;DMR 1234567;and 2345678', 
+                  'Contract  DE-AC05--00OR22725 (DOE) ,  and NIH/NCI',
+                  '', 'Funded by the “SBIR” program-- 2005 . ']
+    normalized = award_id.normalizeTextSeries(pd.Series(statements))
+    assert normalized.tolist()==[award_id.normalizeText(s) 
+                                 for s in statements]
+
+def _writeResources(folder):
+    acronyms, agencies, nih_institutes, zipcodes = inputs
+    (folder / 'acronyms.txt').write_text('\n'.join(acronyms) + '\n')
+    for file_name, table, columns in [
+            ('agencies.tsv', agencies, ['ACNM','TITLE']),
+            ('nih_institutes.tsv', nih_institutes, ['ACNM','TITLE']),
+            ('zipcodes.tsv', zipcodes, ['City','Zipcode'])]:
+        rows = ['\t'.join(columns)] + ['\t'.join(row) for row in zip(*table)]
+        (folder / file_name).write_text('\n'.join(rows) + '\n')
+
+def test_resource_bundle_is_loaded_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(award_id, 'folder', str(tmp_path))
+    _writeResources(tmp_path)
+    bundle = award_id.build_resource_bundle()
+    loaded = award_id.load_resource_bundle()
+    assert tuple(loaded)==tuple(bundle)
+    assert list(loaded[0])==inputs[0]
+    assert tuple(loaded[1:])==inputs[1:]
+    assert loaded.matchers==bundle.matchers
+    
+    # The matchers restored from the bundle find the same agencies
+    statement = 'Supported by the National Institutes of Health (NCI) and NSF'
+    matcher = award_id.AgencyMatcher(loaded[1], loaded[2], 
+                                     state=loaded.matchers['agency'])
+    assert matcher.find(statement)==\
+        award_id.AgencyMatcher(inputs[1], inputs[2]).find(statement)
+
+def test_stale_resource_bundle_is_refused(tmp_path, monkeypatch):
+    monkeypatch.setattr(award_id, 'folder', str(tmp_path))
+    _writeResources(tmp_path)
+    award_id.build_resource_bundle()
+    with open(tmp_path / 'agencies.tsv', 'a') as f_out:
+        f_out.write('DOE\tDepartment of Energy\n')
+    with pytest.raises(ValueError, match='has changed'):
+        award_id.load_resource_bundle()
+    assert tuple(award_id.load_resource_bundle(validate=False)[1:])==\
+        inputs[1:]
+    
+    award_id.build_resource_bundle()
+    award_id.load_resource_bundle()
+    monkeypatch.setattr(award_id, 'RESOURCE_BUNDLE_VERSION', 
+                        award_id.RESOURCE_BUNDLE_VERSION+1)
+    with pytest.raises(ValueError, match='version'):
+        award_id.load_resource_bundle()
+
+def test_batch_extraction_is_the_same_as_of_each_statement(tmp_path):
+    import pandas as pd
+    
+    try:
+        award_id.getEnglishDictionary()
+    except LookupError:
+        pytest.skip('the NLTK corpora are not installed')
+    sys.path.insert(0, os.path.join(root, 'benchmarks'))
+    from award_id_pipeline import synthetic_inputs, synthetic_statements
+    
+    inputs = synthetic_inputs()
+    statements = synthetic_statements(100)
+    df = pd.DataFrame(statements, columns=['gi_statement', 'year'])
+    expected = pd.DataFrame(
+        [award_id.award_id_extractor(s, inputs, year) 
+         for s, year in statements])
+    expected.loc[expected.award_id=='','award_id'] = float('nan')
+    cache = str(tmp_path / 'cache.sqlite')
+    for _ in range(2):
+        # The second time, the results come from the cache
+        results = award_id.award_id_extractor_df(df, year_col='year', 
+                                                  inputs=inputs, n_cores=1, 
+                                                  chunksize=30, cache=cache)
+        assert results.astype(str).values.tolist()==\
+            expected.astype(str).values.tolist()
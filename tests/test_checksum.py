@@ -0,0 +1,48 @@
+import os
+import sys
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, root)
+
+import checksum
+
+def _files(tmp_path):
+    contents = [b'', b'award ids\n', os.urandom(3*65536+17)]
+    filenames = []
+    for i, content in enumerate(contents):
+        path = tmp_path / f'file_{i}.bin'
+        path.write_bytes(content)
+        filenames.append(str(path))
+    return filenames
+
+def test_md5sums_accepts_a_generator(tmp_path):
+    filenames = _files(tmp_path)
+    checksums = checksum.md5sums(filename for filename in filenames)
+    assert checksums=={filename:checksum.md5sum(filename) 
+                       for filename in filenames}
+
+def test_manifest_from_a_generator(tmp_path):
+    filenames = _files(tmp_path)
+    manifest = str(tmp_path / 'checksums.md5')
+    failed = checksum.write_manifest(
+        (filename for filename in filenames), manifest, n_workers=2)
+    assert failed==[]
+    assert [filename for filename, _ in checksum.read_manifest(manifest)]==\
+        filenames
+    assert checksum.verify_manifest(manifest)==\
+        [(filename, 'OK') for filename in filenames]
+
+def test_manifest_escapes_special_names(tmp_path):
+    filenames = []
+    for name in ['back\\slash', 'new\nline', 'carriage\rreturn', 'all\\\r\n']:
+        path = tmp_path / name
+        path.write_bytes(name.encode())
+        filenames.append(str(path))
+    manifest = str(tmp_path / 'checksums.md5')
+    checksum.write_manifest(filenames, manifest, n_workers=2)
+    with open(manifest, 'rb') as f_in:
+        lines = f_in.read().split(b'\n')[:-1]
+    assert len(lines)==len(filenames)
+    assert all(line.startswith(b'\\') and b'\r' not in line for line in lines)
+    assert checksum.read_manifest(manifest)==\
+        [(filename, checksum.md5sum(filename)) for filename in filenames]
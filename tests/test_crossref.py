@@ -0,0 +1,132 @@
+import os
+import sys
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+
+import crossref
+from crossref_stub import StubServer, synthetic_dois, unknown_prefix
+
+email_addr = 'stub@example.org'
+
+def _rows(df):
+    return sorted(map(tuple, df.astype(str).values.tolist()))
+
+def test_cache_avoids_the_requests_on_a_rerun(tmp_path):
+    dois = synthetic_dois(1000) + [f'{unknown_prefix}stub.{i}' 
+                                  for i in range(10)]
+    cache = str(tmp_path / 'crossref.sqlite')
+    with StubServer() as server:
+        reference = crossref.get_data_from_crossref(dois, email_addr, 
+                                                    url=server.url)
+        requests = server.requests
+    with StubServer() as server:
+        crossref.get_data_from_crossref(dois[:800], email_addr, 
+                                        url=server.url, cache=cache)
+    with StubServer() as server:
+        # Only the DOIs not looked up yet are requested
+        first = crossref.get_data_from_crossref(dois, email_addr, 
+                                                url=server.url, cache=cache)
+        assert 0<server.requests<requests
+    with StubServer() as server:
+        second = crossref.get_data_from_crossref(dois, email_addr, 
+                                                 url=server.url, cache=cache)
+        assert server.requests==0
+    assert _rows(first)==_rows(reference)
+    assert _rows(second)==_rows(reference)
+    with StubServer() as server:
+        # With a ttl of 0, the cached works are expired
+        crossref.get_data_from_crossref(dois, email_addr, url=server.url, 
+                                        cache=cache, ttl=0)
+        assert server.requests==requests
+
+def test_misses_keep_the_doi_of_the_caller(tmp_path):
+    dois = synthetic_dois(200) + [f'{unknown_prefix}Unknown.{i}' 
+                                  for i in range(5)]
+    cache = str(tmp_path / 'crossref.sqlite')
+    with StubServer() as server:
+        reference = crossref.get_data_from_crossref(dois, email_addr, 
+                                                    url=server.url, 
+                                                    all_dois=True)
+        first = crossref.get_data_from_crossref(dois, email_addr, 
+                                                url=server.url, 
+                                                all_dois=True, cache=cache)
+        second = crossref.get_data_from_crossref(dois, email_addr, 
+                                                 url=server.url, 
+                                                 all_dois=True, cache=cache)
+    misses = sorted(reference[~reference.found].doi)
+    assert misses==[doi for doi in dois if doi.startswith(unknown_prefix)]
+    assert _rows(first)==_rows(reference)
+    assert _rows(second)==_rows(reference)
+
+def test_small_pages_and_chunks_give_the_same_works():
+    dois = synthetic_dois(500)
+    with StubServer() as server:
+        client = crossref.CrossrefClient(email_addr, url=server.url)
+        reference = client.fetch_all(client.chunks(dois))
+    with StubServer() as server:
+        # The works of each chunk are split in many pages (with the 
+        #  cursor), and the URLs longer than the ones accepted by the
+        #  server are split in two
+        client = crossref.CrossrefClient(email_addr, url=server.url, 
+                                         max_rows=7, max_url_length=20000)
+        paged = client.fetch_all(client.chunks(dois))
+        assert server.requests>len(client.chunks(dois))
+    key = lambda records: sorted((record['doi'], repr(record['award_id'])) 
+                                 for record in records)
+    assert key(paged)==key(reference)
+
+def test_cache_is_read_in_batches(tmp_path):
+    dois = synthetic_dois(2000)
+    cache = crossref.CrossrefCache(str(tmp_path / 'crossref.sqlite'))
+    cache.put({doi.lower(): {'DOI': doi} for doi in dois[:1500]})
+    batches = list(cache.iter_get(dois))
+    assert len(batches)==3
+    assert all(len(batch)<=900 for batch in batches)
+    found = {}
+    for batch in batches:
+        found.update(batch)
+    assert found==cache.get(dois)
+    assert found=={doi.lower(): {'DOI': doi} for doi in dois[:1500]}
+    cache.close()
+
+def test_streamed_rows_are_the_same_of_the_dataframe(tmp_path):
+    import pandas as pd
+    
+    dois = synthetic_dois(1000) + [f'{unknown_prefix}stub.{i}' 
+                                   for i in range(10)]
+    dois += dois[:100]
+    cache = str(tmp_path / 'crossref.sqlite')
+    with StubServer() as server:
+        reference = crossref.get_data_from_crossref(dois, email_addr, 
+                                                    url=server.url)
+        streamed = [row for rows in crossref.iter_crossref_rows(
+                        dois, email_addr, url=server.url, cache=cache)
+                    for row in rows]
+    with StubServer() as server:
+        # The second time, the rows come from the cache
+        cached = [row for rows in crossref.iter_crossref_rows(
+                      dois, email_addr, url=server.url, cache=cache)
+                  for row in rows]
+        assert server.requests==0
+    pairs = lambda rows: {(doi, award_id) for doi, _, award_id in rows}
+    assert pairs(streamed)=={(doi, None if pd.isna(award_id) else award_id)
+                             for doi, award_id in zip(reference.doi, 
+                                                      reference.award_id)}
+    assert set(streamed)==set(cached)
+
+def test_written_rows_are_the_same_of_the_streamed_ones(tmp_path):
+    import pandas as pd
+    
+    dois = synthetic_dois(500)
+    with StubServer() as server:
+        streamed = {row for rows in crossref.iter_crossref_rows(
+                        dois, email_addr, url=server.url) for row in rows}
+        n_rows = crossref.write_crossref_rows(dois, email_addr, 
+                                              str(tmp_path / 'rows.tsv'), 
+                                              url=server.url)
+    written = pd.read_csv(tmp_path / 'rows.tsv', sep='\t')
+    assert n_rows==len(written)==len(streamed)
+    assert {tuple(None if pd.isna(value) else value for value in row) 
+            for row in written.itertuples(index=False)}==streamed
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+
+from import_time import budgets, importTime
+
+heavy = ['numpy', 'pandas', 'nltk', 'requests', 'tqdm']
+
+@pytest.mark.parametrize('module', sorted(budgets))
+def test_import_time_within_budget(module):
+    # Warm-up run, to write the bytecode cache
+    importTime(module)
+    elapsed = min(importTime(module) for _ in range(3))
+    assert elapsed<=budgets[module], \
+        f'importing {module} takes {elapsed:.2f} ms ' \
+        f'(budget {budgets[module]} ms)'
+
+@pytest.mark.parametrize('module', sorted(budgets))
+def test_import_does_not_load_heavy_dependencies(module):
+    out = subprocess.run(
+        [sys.executable, '-c', 
+         f'import sys, {module}; print(" ".join(sorted(sys.modules)))'],
+        cwd=root, capture_output=True, text=True, check=True)
+    loaded = set(out.stdout.split())
+    assert [dependency for dependency in heavy if dependency in loaded]==[]